@@ -0,0 +1,44 @@
+#!-*- utf-8 -*-
+# 对比两次性能测试结果的各阶段耗时中位数
+# 用法: python -m benchmark.compare base.json new.json
+
+import argparse
+import json
+
+
+def load_summary(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(x["scenario"], x["files"], x["mode"]): x for x in report.get("summary", [])}
+
+
+def _ratio(base: float, new: float) -> str:
+    if not base:
+        return "    -"
+    return f"{new / base:5.2f}x"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare two benchmark results")
+    parser.add_argument("base", help="baseline result file")
+    parser.add_argument("new", help="new result file")
+    parser.add_argument("--stages", action="store_true", help="show every stage, not only the total")
+    args = parser.parse_args()
+
+    base, new = load_summary(args.base), load_summary(args.new)
+    for key in sorted(base.keys() & new.keys()):
+        old_item, new_item = base[key], new[key]
+        print(f"{key[0]:<10} files={key[1]:<6} {key[2]:<5} total {old_item['total']:8.3f}s -> "
+              f"{new_item['total']:8.3f}s {_ratio(old_item['total'], new_item['total'])}")
+        if not args.stages:
+            continue
+        for stage in sorted(old_item["stages"].keys() | new_item["stages"].keys()):
+            old_cost, new_cost = old_item["stages"].get(stage, 0.0), new_item["stages"].get(stage, 0.0)
+            print(f"    {stage:<32} {old_cost:8.3f}s -> {new_cost:8.3f}s {_ratio(old_cost, new_cost)}")
+
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{key[0]:<10} files={key[1]:<6} {key[2]:<5} only in {'base' if key in base else 'new'}")
+
+
+if __name__ == '__main__':
+    main()
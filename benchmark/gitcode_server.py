@@ -0,0 +1,172 @@
+#!-*- utf-8 -*-
+
+import itertools
+import json
+import re
+import threading
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class GitcodeStore:
+    """
+    本地 Gitcode 替身的数据: PR 详情、评论、标签, 以及各接口调用次数
+    """
+
+    def __init__(self):
+        self.prs = {}  # key: (owner, repo, pr_id), value: pr 详情
+        self.comments = {}  # key: (owner, repo, pr_id), value: 评论列表, 按创建时间升序
+        self.labels = {}  # key: (owner, repo, pr_id), value: 标签列表
+        self.calls = Counter()  # key: "METHOD 接口", value: 调用次数
+        self.login = "benchmark-bot"  # access_token 所属用户, 即机器人账号
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def add_pr(self, owner: str, repo: str, pr_id: int, head_sha: str, branch: str = "master", title: str = ""):
+        """
+        注册一个 PR
+        """
+        self.prs[(owner, repo, str(pr_id))] = {
+            "title": title or f"benchmark pr {pr_id}",
+            "body": "",
+            "mergeable": True,
+            "base": {"label": branch, "ref": branch},
+            "head": {"sha": head_sha},
+            "user": {"login": "benchmark"},
+        }
+
+    def reset_pr(self, owner: str, repo: str, pr_id: int):
+        """
+        清空 PR 的评论与标签, 使每次运行都从创建 checklist 开始
+        """
+        with self.lock:
+            self.comments.pop((owner, repo, str(pr_id)), None)
+            self.labels.pop((owner, repo, str(pr_id)), None)
+
+    def take_calls(self) -> dict:
+        """
+        返回并清空接口调用次数
+        """
+        with self.lock:
+            calls, self.calls = dict(self.calls), Counter()
+        return calls
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+
+def _make_handler(store: GitcodeStore):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持 keep-alive, 与真实服务一致
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, data=None, headers: dict = None):
+            body = json.dumps(data).encode("utf-8") if data is not None else b""
+            self.send_response(code)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def _route(self, method: str):
+            url = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            if url.path == "/api/v5/user" and method == "GET":
+                with store.lock:
+                    store.calls["GET user"] += 1
+                return self._send(200, {"login": store.login})
+
+            match = re.match(r"/api/v5/repos/([^/]+)/([^/]+)/pulls/(.*)$", url.path)
+            if not match:
+                return self._send(404, {"message": "not found"})
+
+            owner, repo, rest = match.groups()
+            with store.lock:
+                # 统一接口名, 去掉 PR 编号与评论 id
+                store.calls[f"{method} " + re.sub(r"\d+", "{id}", rest.split("/labels/")[0])] += 1
+
+                if re.fullmatch(r"\d+", rest) and method == "GET":
+                    detail = store.prs.get((owner, repo, rest))
+                    return self._send(200, detail) if detail else self._send(404, {"message": "pr not found"})
+
+                matched = re.fullmatch(r"(\d+)/comments", rest)
+                if matched:
+                    comments = store.comments.setdefault((owner, repo, matched.group(1)), [])
+                    if method == "POST":
+                        comment = {"id": store.next_id(), "body": self._body()["body"], "user": {"login": store.login}}
+                        comments.append(comment)
+                        return self._send(201, comment)
+
+                    ordered = comments[::-1] if query.get("direction", ["desc"])[0] == "desc" else comments
+                    per_page = int(query.get("per_page", ["20"])[0])
+                    page = int(query.get("page", ["1"])[0])
+                    total_page = max(1, (len(ordered) + per_page - 1) // per_page)
+                    return self._send(200, ordered[(page - 1) * per_page: page * per_page],
+                                      {"total_page": str(total_page)})
+
+                matched = re.fullmatch(r"comments/(\d+)", rest)
+                if matched:
+                    for comments in store.comments.values():
+                        for comment in comments:
+                            if comment["id"] != int(matched.group(1)):
+                                continue
+                            if method == "DELETE":
+                                comments.remove(comment)
+                                return self._send(204)
+                            comment["body"] = self._body()["body"]
+                            return self._send(200, comment)
+                    return self._send(404, {"message": "comment not found"})
+
+                matched = re.fullmatch(r"(\d+)/labels(?:/(.*))?", rest)
+                if matched:
+                    labels = store.labels.setdefault((owner, repo, matched.group(1)), [])
+                    if method == "GET":
+                        return self._send(200, [{"name": x} for x in labels])
+                    if method == "POST":
+                        body = self._body()
+                        labels.extend(x for x in ([body] if isinstance(body, str) else body) if x not in labels)
+                        return self._send(201, [{"name": x} for x in labels])
+                    if method == "DELETE":
+                        for name in (matched.group(2) or "").split(","):
+                            if name in labels:
+                                labels.remove(name)
+                        return self._send(204)
+
+            return self._send(404, {"message": "not found"})
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_PATCH(self):
+            self._route("PATCH")
+
+        def do_DELETE(self):
+            self._route("DELETE")
+
+    return Handler
+
+
+def serve_gitcode(host: str = "127.0.0.1", port: int = 0) -> tuple[GitcodeStore, str, ThreadingHTTPServer]:
+    """
+    在后台线程启动本地 Gitcode v5 接口替身, 实现 GitcodeApp 使用的接口
+    :param host: 监听地址
+    :param port: 监听端口, 0 表示随机端口
+    :return: tuple(数据, api 地址, http 服务)
+    """
+    store = GitcodeStore()
+    server = ThreadingHTTPServer((host, port), _make_handler(store))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gitcode-server", daemon=True).start()
+    return store, f"http://{host}:{server.server_port}/api/v5", server
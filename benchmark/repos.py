@@ -0,0 +1,196 @@
+#!-*- utf-8 -*-
+
+import functools
+import os
+import subprocess
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+
+COMMITTER = "benchmark <benchmark@example.com> 1700000000 +0800"
+SOURCE_SUFFIXES = [".c", ".py", ".go", ".h", ".txt"]
+
+
+class FastImport:
+    """
+    生成 git fast-import 数据流, 一次写入大量文件, 比逐个 git add 快得多
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self._mark = 0
+
+    def commit(self, ref: str, files: dict[str, str], deletes: list[str] = (), parent: int = None,
+               message: str = "benchmark") -> int:
+        """
+        新增一个提交
+        :param ref: 提交所在的引用, eg: refs/heads/master
+        :param files: key: 文件路径, value: 文件内容
+        :param deletes: 删除的文件路径
+        :param parent: 父提交的 mark, 为空时沿用 ref 当前提交
+        :param message: 提交信息
+        :return: 提交的 mark
+        """
+        self._mark += 1
+        message = message.encode("utf-8")
+        self.chunks.append(f"commit {ref}\nmark :{self._mark}\ncommitter {COMMITTER}\n"
+                           f"data {len(message)}\n".encode("utf-8") + message + b"\n")
+        if parent is not None:
+            self.chunks.append(f"from :{parent}\n".encode("utf-8"))
+        for path in deletes:
+            self.chunks.append(f"D {path}\n".encode("utf-8"))
+        for path, content in files.items():
+            data = content.encode("utf-8")
+            self.chunks.append(f"M 100644 inline {path}\ndata {len(data)}\n".encode("utf-8") + data + b"\n")
+        self.chunks.append(b"\n")
+        return self._mark
+
+    def write(self, git_dir: str):
+        """
+        创建裸仓库并导入所有提交
+        :param git_dir: 裸仓库目录
+        """
+        os.makedirs(git_dir, exist_ok=True)
+        subprocess.run(["git", "init", "--quiet", "--bare", git_dir], check=True)
+        subprocess.run(["git", "-C", git_dir, "symbolic-ref", "HEAD", "refs/heads/master"], check=True)
+        # 支持 blobless 模式的 partial clone 与按对象 id 补充获取
+        subprocess.run(["git", "-C", git_dir, "config", "uploadpack.allowFilter", "true"], check=True)
+        subprocess.run(["git", "-C", git_dir, "config", "uploadpack.allowAnySHA1InWant", "true"], check=True)
+        subprocess.run(["git", "-C", git_dir, "fast-import", "--quiet"], input=b"".join(self.chunks), check=True)
+        subprocess.run(["git", "-C", git_dir, "update-server-info"], check=True)
+
+
+def _dump(data: dict) -> str:
+    return yaml.safe_dump(data, sort_keys=False, allow_unicode=True)
+
+
+def _sig_info(sig: str, index: int, packages: list[str], extra_maintainer: bool = False) -> dict:
+    maintainers = [{"gitee_id": f"{sig}-maintainer-{x}", "name": f"maintainer {x}",
+                    "email": f"{sig}-{x}@example.com"} for x in range(2 + index % 3)]
+    if extra_maintainer:
+        maintainers.append({"gitee_id": f"{sig}-maintainer-new", "name": "new maintainer",
+                            "email": f"{sig}-new@example.com"})
+    return {
+        "name": sig,
+        "description": f"synthetic sig {index}",
+        "maintainers": maintainers,
+        "repositories": [{
+            "repo": [f"src-openeuler/{x}" for x in packages],
+            "committers": [{"gitee_id": f"{sig}-committer-{x}"} for x in range(1 + index % 2)],
+        }],
+    }
+
+
+def _repo_yaml(package: str, sig: str) -> str:
+    return _dump({"name": package, "description": f"package {package} of {sig}", "branches": [
+        {"name": "master", "type": "protected"}]})
+
+
+def build_community(git_dir: str, sigs: int, pr_sizes: list[int], packages_per_sig: int = 3) -> dict[int, int]:
+    """
+    生成 community 风格的仓库: sig/<sig>/sig-info.yaml 与 sig/<sig>/src-openeuler/<x>/<repo>.yaml
+    每个 PR 大小对应一个 PR, 按 sig-info 修改、新增仓库、修改仓库配置三种变更轮流生成
+    :param git_dir: 裸仓库目录
+    :param sigs: sig 数量
+    :param pr_sizes: PR 变更文件数列表
+    :param packages_per_sig: 每个 sig 的仓库数
+    :return: key: PR 编号, value: PR 变更文件数
+    """
+    names = [f"sig-{x:05d}" for x in range(sigs)]
+    packages = {sig: [f"{sig}-pkg-{x}" for x in range(packages_per_sig)] for sig in names}
+
+    files = {"sig/sigs.yaml": _dump({"sigs": [{"name": x} for x in names]})}
+    for index, sig in enumerate(names):
+        files[f"sig/{sig}/sig-info.yaml"] = _dump(_sig_info(sig, index, packages[sig]))
+        for package in packages[sig]:
+            files[f"sig/{sig}/src-openeuler/{package[0]}/{package}.yaml"] = _repo_yaml(package, sig)
+
+    stream = FastImport()
+    master = stream.commit("refs/heads/master", files, message="init community")
+
+    prs = {}
+    for pr_id, size in enumerate(pr_sizes, 1):
+        changes = {}
+        for x in range(size):
+            index = x // 3 % sigs
+            sig = names[index]
+            if x % 3 == 0:  # maintainer 变更
+                changes[f"sig/{sig}/sig-info.yaml"] = _dump(_sig_info(sig, index, packages[sig], True))
+            elif x % 3 == 1:  # 新增仓库
+                package = f"{sig}-new-{pr_id}-{x}"
+                changes[f"sig/{sig}/src-openeuler/{package[0]}/{package}.yaml"] = _repo_yaml(package, sig)
+            else:  # 修改仓库配置
+                package = packages[sig][x // 3 // sigs % packages_per_sig]
+                changes[f"sig/{sig}/src-openeuler/{package[0]}/{package}.yaml"] = \
+                    _repo_yaml(package, sig) + f"# pr {pr_id}\n"
+        stream.commit(f"refs/merge-requests/{pr_id}/head", changes, parent=master, message=f"pr {pr_id}")
+        prs[pr_id] = len(changes)
+
+    stream.write(git_dir)
+    return prs
+
+
+def _spec(name: str, version: str, license_name: str, sources: int) -> str:
+    lines = [f"Name:           {name}", f"Version:        {version}", "Release:        1",
+             f"Summary:        synthetic package {name}", f"License:        {license_name}",
+             f"URL:            https://example.com/{name}", f"Source0:        {name}-{version}.tar.gz", ""]
+    lines += [f"Patch{x:04d}:      {x:04d}-fix.patch" for x in range(sources)]
+    lines += ["", "%description", f"synthetic package {name}", "", "%prep", "%autosetup -p1", "",
+              "%build", "%make_build", "", "%install", "%make_install", "", "%files", "%license LICENSE",
+              "", "%changelog"]
+    return "\n".join(lines) + "\n"
+
+
+def _source(path: str, revision: int) -> str:
+    return "".join(f"// {path} line {x} revision {revision}\n" for x in range(40))
+
+
+def build_package(git_dir: str, name: str, files: int, pr_sizes: list[int]) -> dict[int, int]:
+    """
+    生成 src-openeuler 风格的软件包仓库: <name>.spec 与补丁/源码文件
+    每个 PR 修改 spec 的 Version 与 License, 其余变更一半修改已有文件, 一半新增文件
+    :param git_dir: 裸仓库目录
+    :param name: 软件包名称
+    :param files: master 分支的源码文件数
+    :param pr_sizes: PR 变更文件数列表
+    :return: key: PR 编号, value: PR 变更文件数
+    """
+    base = {f"{name}.spec": _spec(name, "1.0.0", "MIT", files)}
+    for x in range(files):
+        path = f"src/file_{x:05d}{SOURCE_SUFFIXES[x % len(SOURCE_SUFFIXES)]}"
+        base[path] = _source(path, 0)
+
+    stream = FastImport()
+    master = stream.commit("refs/heads/master", base, message=f"init {name}")
+
+    prs = {}
+    for pr_id, size in enumerate(pr_sizes, 1):
+        changes = {f"{name}.spec": _spec(name, f"1.{pr_id}.0", "Apache-2.0", files)}
+        for x in range(size - 1):
+            if x % 2 == 0 and x // 2 < files:
+                path = f"src/file_{x // 2:05d}{SOURCE_SUFFIXES[x // 2 % len(SOURCE_SUFFIXES)]}"
+            else:
+                path = f"src/new_{pr_id}_{x:05d}{SOURCE_SUFFIXES[x % len(SOURCE_SUFFIXES)]}"
+            changes[path] = _source(path, pr_id)
+        stream.commit(f"refs/merge-requests/{pr_id}/head", changes, parent=master, message=f"pr {pr_id}")
+        prs[pr_id] = len(changes)
+
+    stream.write(git_dir)
+    return prs
+
+
+def serve_repos(root: str, host: str = "127.0.0.1", port: int = 0) -> tuple[str, ThreadingHTTPServer]:
+    """
+    通过 git 哑 http 协议提供 root 目录下的裸仓库
+    :param root: 仓库根目录, 仓库路径为 <root>/<owner>/<repo>.git
+    :return: tuple(仓库根地址, http 服务)
+    """
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), functools.partial(Handler, directory=root))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="git-server", daemon=True).start()
+    return f"http://{host}:{server.server_port}", server
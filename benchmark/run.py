@@ -0,0 +1,209 @@
+#!-*- utf-8 -*-
+# 端到端性能测试: 本地生成合成仓库, 启动 Gitcode 接口替身, 按 PR 大小统计 PRHandlerService.run 各阶段耗时
+# 用法: python -m benchmark.run --sizes 1,10,100,1000 --sigs 2000 --repeat 3 --output benchmark.json
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "robot_universal_ci_tools.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from benchmark.gitcode_server import serve_gitcode  # noqa: E402
+from benchmark.repos import build_community, build_package, serve_repos  # noqa: E402
+from business.service import PRHandlerService  # noqa: E402
+
+SCENARIOS = {
+    "community": ("openeuler", "community"),
+    "package": ("src-openeuler", "bench-pkg"),
+}
+
+
+def _git_output(*args: str) -> str:
+    result = subprocess.run(["git", *args], capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def build_repos(remote_dir: str, scenarios: list[str], sizes: list[int], sigs: int, files: int) -> dict:
+    """
+    生成各场景的合成仓库
+    :return: key: 场景, value: dict(PR 编号: 变更文件数)
+    """
+    prs = {}
+    for scenario in scenarios:
+        owner, repo = SCENARIOS[scenario]
+        git_dir = f"{remote_dir}/{owner}/{repo}.git"
+        start = time.perf_counter()
+        if scenario == "community":
+            prs[scenario] = build_community(git_dir, sigs, sizes)
+        else:
+            prs[scenario] = build_package(git_dir, repo, files, sizes)
+        logging.warning(f"build {scenario} repo: {time.perf_counter() - start:.2f}s")
+    return prs
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, x)) for x in files
+                     if not os.path.islink(os.path.join(root, x)))
+    return total
+
+
+def run_once(store, api_url: str, repo_url: str, work_dir: str, owner: str, repo: str, pr_id: int,
+             cold: bool, env_mode: str) -> dict:
+    """
+    执行一次 PR 检查并统计各阶段耗时
+    :param cold: 是否删除镜像仓与 sig 索引, 模拟首次处理该仓库
+    :param env_mode: 代码镜像模式, full / blobless
+    """
+    service = PRHandlerService(owner=owner, repo=repo, access_token="benchmark", pr_id=pr_id)
+    service.gitcode_app.base_url = api_url
+    service.env_mode = env_mode
+    service.result_cache_size = 0  # 每次运行都执行完整流程
+    service.repo_url = repo_url
+    suffix = ".blobless.git" if env_mode == "blobless" else ".git"
+    service.mirror_dir = f"{work_dir}/data/mirrors/{owner}/{repo}{suffix}"
+    service.state_path = f"{work_dir}/data/state/{owner}_{repo}_{pr_id}.json"
+    service.index_path = f"{work_dir}/data/index/{owner}_{repo}_{env_mode}.json"
+
+    if cold:
+        shutil.rmtree(service.mirror_dir, ignore_errors=True)
+        for path in (service.index_path, f"{service.index_path}.lock"):
+            if os.path.exists(path):
+                os.remove(path)
+    store.reset_pr(owner, repo, pr_id)
+    store.take_calls()
+
+    start = time.perf_counter()
+    success = service.run("create")
+    total = time.perf_counter() - start
+
+    return {
+        "success": bool(success),
+        "total": round(total, 6),
+        "stages": {k: round(v, 6) for k, v in sorted(service.timer.stages.items())},
+        "api_calls": store.take_calls(),
+        "mirror_bytes": _disk_usage(service.mirror_dir),
+    }
+
+
+def summarize(results: list[dict]) -> list[dict]:
+    """
+    按 场景/PR 大小/冷热 汇总各阶段耗时中位数
+    """
+    groups = {}
+    for item in results:
+        groups.setdefault((item["scenario"], item["files"], item["mode"]), []).append(item)
+
+    summary = []
+    for (scenario, files, mode), items in sorted(groups.items()):
+        stages = sorted({x for item in items for x in item["stages"]})
+        summary.append({
+            "scenario": scenario,
+            "files": files,
+            "mode": mode,
+            "runs": len(items),
+            "total": round(statistics.median(x["total"] for x in items), 6),
+            "mirror_bytes": max(x.get("mirror_bytes", 0) for x in items),
+            "stages": {x: round(statistics.median(item["stages"].get(x, 0.0) for item in items), 6)
+                       for x in stages},
+        })
+    return summary
+
+
+def print_summary(summary: list[dict]):
+    for item in summary:
+        top = sorted(item["stages"].items(), key=lambda x: -x[1])[:4]
+        stages = ", ".join(f"{k} {v:.3f}s" for k, v in top)
+        print(f"{item['scenario']:<10} files={item['files']:<6} {item['mode']:<5} "
+              f"total {item['total']:.3f}s mirror {item['mirror_bytes'] / 1024 / 1024:.1f}MiB | {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PR review checklist end-to-end benchmark")
+    parser.add_argument("--scenarios", default="community,package", help="comma separated: community,package")
+    parser.add_argument("--sizes", default="1,10,100,1000", help="comma separated PR sizes (changed files)")
+    parser.add_argument("--sigs", type=int, default=2000, help="number of sigs in the community repo")
+    parser.add_argument("--files", type=int, default=500, help="number of source files in the package repo")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per PR, the first one starts without mirror")
+    parser.add_argument("--remote", choices=["file", "http"], default="file", help="how repos are served")
+    parser.add_argument("--env-mode", choices=["full", "blobless"], default=settings.ENV_MODE,
+                        help="how the repository mirror is fetched")
+    parser.add_argument("--work-dir", help="keep generated repos and work dirs here instead of a temp dir")
+    parser.add_argument("--output", default="benchmark.json", help="machine readable result file")
+    parser.add_argument("--verbose", action="store_true", help="show service logs")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    scenarios = [x for x in args.scenarios.split(",") if x]
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="review-benchmark-")
+    remote_dir = f"{work_dir}/remote"
+
+    store, api_url, api_server = serve_gitcode()
+    git_server = None
+    try:
+        prs = build_repos(remote_dir, scenarios, sizes, args.sigs, args.files)
+        if args.remote == "http":
+            repo_base, git_server = serve_repos(remote_dir)
+        else:
+            repo_base = f"file://{remote_dir}"
+
+        results = []
+        for scenario in scenarios:
+            owner, repo = SCENARIOS[scenario]
+            repo_url = f"{repo_base}/{owner}/{repo}.git"
+            for pr_id, files in prs[scenario].items():
+                head = _git_output("-C", f"{remote_dir}/{owner}/{repo}.git", "rev-parse",
+                                   f"refs/merge-requests/{pr_id}/head")
+                store.add_pr(owner, repo, pr_id, head)
+                for run in range(args.repeat):
+                    result = run_once(store, api_url, repo_url, work_dir, owner, repo, pr_id, cold=(run == 0),
+                                      env_mode=args.env_mode)
+                    result.update(scenario=scenario, files=files, run=run, mode="cold" if run == 0 else "warm")
+                    results.append(result)
+                    if not result["success"]:
+                        logging.error(f"{scenario} pr {pr_id} run {run} failed")
+
+        summary = summarize(results)
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "revision": _git_output("-C", str(settings.BASE_DIR), "rev-parse", "HEAD"),
+                "git": _git_output("--version"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "summary": summary,
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+        print_summary(summary)
+        print(f"result written to {args.output}")
+    finally:
+        api_server.shutdown()
+        if git_server is not None:
+            git_server.shutdown()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!-*- utf-8 -*-
+
+import hashlib
+import logging
+import os
+import string
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+
+import yaml
+
+from common.func import YAML_LOADER
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+
+class ChecklistItem(NamedTuple):
+    """
+    编译后的 checklist 条目
+    """
+    name: str
+    condition: str | None  # 检查条件, None 表示无条件添加
+    category: str  # 审视类别显示名称
+    claim: str
+    explain: str
+    placeholders: frozenset  # claim/explain 中需要填充的变量, 为空时无需 format
+
+
+class CompiledChecklist(NamedTuple):
+    """
+    编译后的 checklist 配置, 进程内共享, 不可修改
+    """
+    basic: tuple  # tuple[ChecklistItem]
+    src_openeuler: tuple  # tuple[ChecklistItem]
+    customization: MappingProxyType  # key: 仓库名, value: tuple[ChecklistItem]
+    conditions: frozenset  # 配置中引用的所有检查条件
+    digest: str  # 配置文件内容的 sha256
+
+    def active_conditions(self, owner: str, repo: str) -> frozenset:
+        """
+        owner/repo 的 checklist 中引用的检查条件
+        """
+        items = self.basic + (self.src_openeuler if owner == "src-openeuler" else ()) + \
+            self.customization.get(repo, ())
+        return frozenset(x.condition for x in items if x.condition)
+
+
+def _placeholders(*texts: str) -> frozenset:
+    return frozenset(x[1] for text in texts for x in string.Formatter().parse(text) if x[1])
+
+
+def _compile_items(section: dict, category: dict, default_category: str = None) -> tuple:
+    items = []
+    for review_type, raw_items in (section or {}).items():
+        category_name = category.get(default_category or review_type)
+        for item in raw_items or []:
+            claim, explain = item.get("claim") or "", item.get("explain") or ""
+            items.append(ChecklistItem(name=item.get("name"),
+                                       condition=item.get("condition"),
+                                       category=category_name,
+                                       claim=claim,
+                                       explain=explain,
+                                       placeholders=_placeholders(claim, explain),
+                                       ))
+    return tuple(items)
+
+
+def compile_checklist(content: bytes, category: dict) -> CompiledChecklist:
+    """
+    编译 checklist 配置
+    :param content: config/reviewer_checklist_**.yaml 文件内容
+    :param category: 审视类别显示名称, Category_ZH / Category_EN
+    :return:
+    """
+    raw = yaml.load(content, Loader=YAML_LOADER) or {}
+
+    basic = _compile_items(raw.get("basic"), category)
+    src_openeuler = _compile_items(raw.get("src-openeuler"), category)
+    customization = {repo: _compile_items({repo: items}, category, "customization")
+                     for repo, items in (raw.get("customization") or {}).items()}
+
+    conditions = {x.condition for x in basic + src_openeuler if x.condition}
+    conditions.update(x.condition for items in customization.values() for x in items if x.condition)
+
+    return CompiledChecklist(basic=basic,
+                             src_openeuler=src_openeuler,
+                             customization=MappingProxyType(customization),
+                             conditions=frozenset(conditions),
+                             digest=hashlib.sha256(content).hexdigest(),
+                             )
+
+
+_cache = {}  # key: 配置文件路径, value: (mtime, CompiledChecklist)
+_cache_lock = threading.Lock()
+
+
+def get_checklist(path: str, category: dict) -> CompiledChecklist:
+    """
+    获取编译后的 checklist 配置, 每个进程只编译一次, 配置文件 mtime 变化且内容变化时重新编译
+    :param path: 配置文件路径
+    :param category: 审视类别显示名称, 与配置文件语言一致
+    :return:
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            content = f.read()
+
+        if cached is not None and cached[1].digest == hashlib.sha256(content).hexdigest():
+            checklist = cached[1]
+        else:
+            logging.info(f"compile checklist config: {path}")
+            checklist = compile_checklist(content, category)
+
+        _cache[path] = (mtime, checklist)
+        return checklist
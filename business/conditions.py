@@ -0,0 +1,110 @@
+#!-*- utf-8 -*-
+
+from typing import Callable, NamedTuple
+
+# 检查条件依赖的数据, 只有启用的条件依赖时才会获取
+NEED_DIFF = "diff"  # 与合入分支的 diff 快照
+NEED_MASTER_DIFF = "master-diff"  # 与 master 分支的 diff 快照
+NEED_SPEC = "spec"  # .spec 文件字段的修改情况
+NEED_SIG_INDEX = "sig-index"  # master 分支 sig 索引, 合入分支有更新时需要重新计算
+NEED_PR_SIG_INFO = "pr-sig-info"  # PR 合入后的 sig-info.yaml 内容
+
+
+class Condition(NamedTuple):
+    """
+    注册的检查条件
+    """
+    name: str
+    needs: frozenset  # 依赖的数据, NEED_*
+    inputs: Callable[[str], bool]  # 输入文件: 与上次评估相比, 有变化的文件命中规则时才重新计算
+    evaluate: Callable  # evaluate(service, branch, author) -> 条件结果, 可序列化为 json
+
+    def diff_branch(self, branch: str) -> str:
+        """
+        输入文件所在 diff 快照的对比分支
+        :param branch: 合入分支
+        """
+        return "master" if NEED_MASTER_DIFF in self.needs else branch
+
+    @property
+    def base_dependent(self) -> bool:
+        """
+        是否读取 master 分支文件内容
+        """
+        return NEED_SIG_INDEX in self.needs
+
+
+CONDITIONS = {}  # key: 条件名称, value: Condition, 按注册顺序计算
+
+
+def register(name: str, needs: tuple, inputs: Callable[[str], bool]):
+    """
+    注册检查条件
+    :param name: 条件名称, 与 config/reviewer_checklist_**.yaml 中的 condition 一致
+    :param needs: 依赖的数据, NEED_*
+    :param inputs: 输入文件规则
+    """
+
+    def decorator(func):
+        CONDITIONS[name] = Condition(name=name, needs=frozenset(needs), inputs=inputs, evaluate=func)
+        return func
+
+    return decorator
+
+
+def resolve(names) -> tuple:
+    """
+    checklist 引用的条件中已注册的条件, 未实现的条件(如 sanity_check)忽略
+    :param names: 条件名称
+    :return: tuple[Condition], 按注册顺序
+    """
+    names = set(names)
+    return tuple(x for x in CONDITIONS.values() if x.name in names)
+
+
+@register("code-modified", needs=(NEED_DIFF,), inputs=lambda path: True)
+def code_modified(service, branch: str, author: str) -> dict:
+    return service.check_programing_language(branch)
+
+
+@register("new-file-add", needs=(NEED_DIFF,), inputs=lambda path: True)
+def new_file_add(service, branch: str, author: str) -> bool:
+    return service.has_add_file(branch)
+
+
+@register("license-change", needs=(NEED_DIFF, NEED_SPEC), inputs=lambda path: path.endswith(".spec"))
+def license_change(service, branch: str, author: str) -> bool:
+    return service.has_modify_spec_file(branch, "License")
+
+
+@register("version-change", needs=(NEED_DIFF, NEED_SPEC), inputs=lambda path: path.endswith(".spec"))
+def version_change(service, branch: str, author: str) -> bool:
+    return service.has_modify_spec_file(branch, "Version")
+
+
+# 定制化检查条件, 与 master 分支对比
+@register("maintainer-change", needs=(NEED_MASTER_DIFF, NEED_SIG_INDEX, NEED_PR_SIG_INFO),
+          inputs=lambda path: path.startswith("sig/"))
+def maintainer_change(service, branch: str, author: str) -> dict:
+    return service.maintainer_changed_sigs(service.name_status("master"))
+
+
+@register("sig-update", needs=(NEED_MASTER_DIFF, NEED_SIG_INDEX), inputs=lambda path: path.startswith("sig/"))
+def sig_update(service, branch: str, author: str) -> dict:
+    return service.sig_info_changed(service.name_status("master"))
+
+
+@register("repo-introduce", needs=(NEED_MASTER_DIFF,), inputs=lambda path: path.startswith("sig"))
+def repo_introduce(service, branch: str, author: str) -> bool:
+    return service.is_repo_add(service.name_status("master"))
+
+
+@register("repo-blacklist-change", needs=(NEED_MASTER_DIFF,), inputs=lambda path: path.startswith("sig/"))
+def repo_blacklist_change(service, branch: str, author: str) -> bool:
+    return service.sig_recycle_changed(service.name_status("master"))
+
+
+@register("committer-change", needs=(NEED_MASTER_DIFF, NEED_SIG_INDEX, NEED_PR_SIG_INFO),
+          inputs=lambda path: path.startswith("sig/"))
+def committer_change(service, branch: str, author: str) -> list:
+    return service.committer_change(service.name_status("master"), author)
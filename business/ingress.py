@@ -0,0 +1,126 @@
+#!-*- utf-8 -*-
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from business.service import call
+from business.workspace import get_workspace_manager
+from common.metrics import JOBS_TOTAL, INGRESS_PENDING
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+
+class Ingress:
+    """
+    webhook 入口的调度: 非 DEBUG 模式下在线程池中提交到 worker 池, 任务记录写入后才返回, 不阻塞事件循环;
+    DEBUG 模式下把任务放入内存队列后立即返回, 由独立线程中的事件循环取出任务, 在线程池中直接执行
+    WSGI 与 ASGI 下都可使用
+    """
+
+    def __init__(self, queue_size: int, concurrency: int):
+        self.queue_size = queue_size  # 等待提交的任务数上限
+        self.concurrency = concurrency  # 同时提交或执行的任务数
+        self.accepted = 0  # 接收的任务数
+        self.rejected = 0  # 队列已满被拒绝的任务数
+
+        self._pending = 0  # 已接收未处理完的任务数
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingress")
+
+    def start(self):
+        """
+        启动事件循环线程
+        """
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._queue = asyncio.Queue()
+            ready.set()
+            self._loop.run_until_complete(self._consume())
+
+        threading.Thread(target=run, name="ingress", daemon=True).start()
+        ready.wait()
+
+    async def submit(self, owner: str, repo: str, access_token: str, pr_id, action: str) -> bool:
+        """
+        接收任务, 可在任意事件循环中调用; 返回 True 时任务已记录到任务表(DEBUG 模式下已放入内存队列)
+        :return: 队列已满或任务记录写入失败时返回 False, 调用方应让 webhook 重新投递
+        """
+        if settings.DEBUG:
+            return self.enqueue(owner, repo, access_token, pr_id, action)
+
+        accepted = await asyncio.wrap_future(self._executor.submit(call, owner, repo, access_token, pr_id, action))
+        if not accepted:
+            logging.error(f"submit {owner}/{repo}/{pr_id} {action} failed, ask for redelivery")
+        return accepted
+
+    def enqueue(self, owner: str, repo: str, access_token: str, pr_id, action: str) -> bool:
+        """
+        放入内存队列, 可在任意线程或事件循环中调用, 不阻塞调用方
+        :return: 队列已满时返回 False
+        """
+        with self._lock:
+            if self._pending >= self.queue_size:
+                self.rejected += 1
+                JOBS_TOTAL.inc(result="rejected")
+                logging.error(f"ingress queue is full({self.queue_size}), drop {owner}/{repo}/{pr_id} {action}")
+                return False
+            self._pending += 1
+            self.accepted += 1
+            INGRESS_PENDING.set(self._pending)
+
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (owner, repo, access_token, pr_id, action))
+        return True
+
+    @staticmethod
+    def _run(owner: str, repo: str, access_token: str, pr_id, action: str) -> bool:
+        # DEBUG 模式下直接执行, 与 worker 使用同一把 PR 文件锁, 同一 PR 的多个事件依次执行
+        with get_workspace_manager().pr_lock(owner, repo, pr_id):
+            return call(owner, repo, access_token, pr_id, action)
+
+    async def _consume(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        while True:
+            item = await self._queue.get()
+            await semaphore.acquire()
+            task = asyncio.create_task(self._handle(item, semaphore))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, item: tuple, semaphore: asyncio.Semaphore):
+        try:
+            success = await self._loop.run_in_executor(self._executor, self._run, *item)
+            if not success:
+                logging.error(f"handle {item[0]}/{item[1]}/{item[3]} {item[4]} failed")
+        except Exception as err:
+            logging.exception(f"handle {item[0]}/{item[1]}/{item[3]} {item[4]} failed: {err}")
+        finally:
+            semaphore.release()
+            with self._lock:
+                self._pending -= 1
+                INGRESS_PENDING.set(self._pending)
+
+
+_ingress = None
+_ingress_lock = threading.Lock()
+
+
+def get_ingress() -> Ingress:
+    """
+    获取进程内唯一的 webhook 入口调度, 首次调用时启动
+    """
+    global _ingress
+    with _ingress_lock:
+        if _ingress is None:
+            _ingress = Ingress(queue_size=settings.INGRESS_QUEUE_SIZE, concurrency=settings.INGRESS_CONCURRENCY)
+            _ingress.start()
+    return _ingress
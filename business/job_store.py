@@ -0,0 +1,147 @@
+#!-*- utf-8 -*-
+
+import logging
+import uuid
+from datetime import timedelta
+
+from django.db import DatabaseError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from business.models import ReviewJob
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+# 当前服务进程的标识, 任务记录由创建或恢复它的服务进程负责
+INSTANCE = uuid.uuid4().hex
+
+
+def create_job(owner: str, repo: str, pr_id, action: str) -> int | None:
+    """
+    记录新入队的任务
+    :return: 任务记录 id, 数据库异常时返回 None
+    """
+    try:
+        return ReviewJob.objects.create(owner=owner, repo=repo, pr_id=str(pr_id), action=action,
+                                        instance=INSTANCE).id
+    except DatabaseError as err:
+        logging.error(f"create job record of {owner}/{repo}/{pr_id} failed: {err}")
+        return None
+
+
+def _update(record_id: int | None, **fields):
+    if record_id is None:
+        return
+    try:
+        ReviewJob.objects.filter(id=record_id).update(updated_at=timezone.now(), **fields)
+    except DatabaseError as err:
+        logging.error(f"update job record {record_id} failed: {err}")
+
+
+def merge_job(record_id: int | None, action: str, events: int):
+    """
+    记录合并到排队中任务的事件
+    """
+    _update(record_id, action=action, events=events)
+
+
+def start_job(record_id: int | None):
+    """
+    记录任务开始执行
+    """
+    _update(record_id, state=ReviewJob.STATE_RUNNING, attempts=F("attempts") + 1, started_at=timezone.now())
+
+
+def finish_job(record_id: int | None, state: str, stages: dict = None, error: str = ""):
+    """
+    记录任务执行结束
+    :param state: ReviewJob.STATE_*
+    :param stages: 各阶段耗时, 秒
+    :param error: 失败原因
+    """
+    fields = {"state": state, "error": error, "finished_at": timezone.now()}
+    if stages is not None:
+        fields["stages"] = {k: round(v, 6) for k, v in stages.items()}
+    _update(record_id, **fields)
+
+
+def touch_jobs(record_ids: list[int]):
+    """
+    刷新本进程负责的未完成任务, 避免被其他服务进程当作无人负责的任务恢复
+    """
+    if not record_ids:
+        return
+    try:
+        ReviewJob.objects.filter(id__in=record_ids, instance=INSTANCE).update(updated_at=timezone.now())
+    except DatabaseError as err:
+        logging.error(f"touch {len(record_ids)} job records failed: {err}")
+
+
+def claim_stale_jobs(stale_after: float, max_attempts: int) -> list[ReviewJob]:
+    """
+    认领长时间未刷新的未完成任务, 如服务重启前排队或执行中的任务
+    已达到最大执行次数的任务不再恢复, 标记为失败
+    :param stale_after: 未刷新多少秒后视为无人负责
+    :param max_attempts: 最大执行次数
+    :return: 本进程认领的任务, 需要重新入队
+    """
+    deadline = timezone.now() - timedelta(seconds=stale_after)
+    try:
+        with transaction.atomic():
+            stale = ReviewJob.objects.filter(state__in=ReviewJob.UNFINISHED_STATES, updated_at__lt=deadline) \
+                .exclude(instance=INSTANCE)
+            stale.filter(attempts__gte=max_attempts).update(
+                state=ReviewJob.STATE_FAILED, error=f"gave up after {max_attempts} attempts",
+                finished_at=timezone.now(), updated_at=timezone.now())
+
+            jobs = list(stale.filter(attempts__lt=max_attempts).order_by("id"))
+            # 条件更新, 多个服务进程同时恢复时每个任务只被一个进程认领
+            claimed = [x for x in jobs
+                       if ReviewJob.objects.filter(id=x.id, instance=x.instance, updated_at=x.updated_at)
+                       .update(state=ReviewJob.STATE_QUEUED, instance=INSTANCE, updated_at=timezone.now())]
+    except DatabaseError as err:
+        logging.error(f"claim stale jobs failed: {err}")
+        return []
+
+    return claimed
+
+
+def purge_jobs(retention: float):
+    """
+    删除结束超过保留时间的任务记录
+    :param retention: 保留时间, 秒
+    """
+    try:
+        ReviewJob.objects.exclude(state__in=ReviewJob.UNFINISHED_STATES) \
+            .filter(updated_at__lt=timezone.now() - timedelta(seconds=retention)).delete()
+    except DatabaseError as err:
+        logging.error(f"purge job records failed: {err}")
+
+
+def list_jobs(state: str = None, owner: str = None, repo: str = None, pr_id: str = None, limit: int = 100) -> dict:
+    """
+    按创建时间倒序查询任务, 以及各状态的任务数
+    """
+    jobs = ReviewJob.objects.all()
+    if state:
+        jobs = jobs.filter(state=state)
+    if owner:
+        jobs = jobs.filter(owner=owner)
+    if repo:
+        jobs = jobs.filter(repo=repo)
+    if pr_id:
+        jobs = jobs.filter(pr_id=str(pr_id))
+
+    counts = ReviewJob.objects.values("state").annotate(total=Count("id"))
+    return {
+        "states": {x["state"]: x["total"] for x in counts},
+        "jobs": [x.to_dict() for x in jobs.order_by("-id")[:limit]],
+    }
+
+
+def get_job(record_id: int) -> dict | None:
+    """
+    查询单个任务
+    """
+    job = ReviewJob.objects.filter(id=record_id).first()
+    return job.to_dict() if job is not None else None
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.25 on 2026-10-17 17:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChecklistResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('owner', models.CharField(max_length=128)),
+                ('repo', models.CharField(max_length=128)),
+                ('base_sha', models.CharField(max_length=64)),
+                ('head_sha', models.CharField(max_length=64)),
+                ('language', models.CharField(max_length=8)),
+                ('config_digest', models.CharField(max_length=64)),
+                ('conditions', models.JSONField(default=dict)),
+                ('conflicts', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('accessed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.25 on 2026-10-17 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('business', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=128)),
+                ('repo', models.CharField(max_length=128)),
+                ('pr_id', models.CharField(max_length=32)),
+                ('action', models.CharField(max_length=16)),
+                ('state', models.CharField(db_index=True, default='queued', max_length=16)),
+                ('events', models.IntegerField(default=1)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('stages', models.JSONField(default=dict)),
+                ('instance', models.CharField(db_index=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,66 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class ChecklistResult(models.Model):
+    """
+    检查条件结果缓存, 合入分支与 PR 都没有更新时直接复用, 不再准备代码环境
+    """
+    key = models.CharField(max_length=64, unique=True)  # 缓存键, business.result_cache.result_key
+    owner = models.CharField(max_length=128)
+    repo = models.CharField(max_length=128)
+    base_sha = models.CharField(max_length=64)  # 合入分支 commit
+    head_sha = models.CharField(max_length=64)  # PR 最新 commit
+    language = models.CharField(max_length=8)  # checklist 语言, zh / en
+    config_digest = models.CharField(max_length=64)  # checklist 配置文件内容的 sha256
+    conditions = models.JSONField(default=dict)  # 检查条件结果, key: 条件, value: 结果
+    conflicts = models.JSONField(default=list)  # PR 合入时冲突的文件
+    created_at = models.DateTimeField(auto_now_add=True)
+    accessed_at = models.DateTimeField(default=timezone.now, db_index=True)  # 最近一次命中时间, 按此淘汰
+
+
+class ReviewJob(models.Model):
+    """
+    PR 检查任务, 记录任务状态、各阶段耗时与执行次数; 服务重启后未完成的任务重新入队
+    """
+    STATE_QUEUED = "queued"  # 等待执行
+    STATE_RUNNING = "running"  # 执行中
+    STATE_SUCCEEDED = "succeeded"  # 执行成功
+    STATE_FAILED = "failed"  # 执行失败
+    STATE_TIMED_OUT = "timed_out"  # 执行超时
+    STATE_CRASHED = "crashed"  # worker 进程异常退出
+    STATE_MERGED = "merged"  # 恢复时同一 PR 已有排队中的任务, 合并到该任务
+    UNFINISHED_STATES = (STATE_QUEUED, STATE_RUNNING)
+
+    owner = models.CharField(max_length=128)
+    repo = models.CharField(max_length=128)
+    pr_id = models.CharField(max_length=32)
+    action = models.CharField(max_length=16)  # create / edit
+    state = models.CharField(max_length=16, default=STATE_QUEUED, db_index=True)
+    events = models.IntegerField(default=1)  # 合并的 webhook 事件数
+    attempts = models.IntegerField(default=0)  # 开始执行的次数
+    error = models.TextField(default="", blank=True)
+    stages = models.JSONField(default=dict)  # 各阶段耗时, 秒
+    instance = models.CharField(max_length=32, db_index=True)  # 负责执行的服务进程, business.job_store.INSTANCE
+    created_at = models.DateTimeField(auto_now_add=True)  # 入队时间
+    started_at = models.DateTimeField(null=True)  # 最近一次开始执行时间
+    finished_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # 服务进程定期刷新, 长时间未刷新的未完成任务视为无人负责
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "owner": self.owner,
+            "repo": self.repo,
+            "pr_id": self.pr_id,
+            "action": self.action,
+            "state": self.state,
+            "events": self.events,
+            "attempts": self.attempts,
+            "error": self.error,
+            "stages": self.stages,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,63 @@
+#!-*- utf-8 -*-
+
+import hashlib
+import logging
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from business.models import ChecklistResult
+from common.metrics import RESULT_CACHE_TOTAL
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+
+def result_key(owner: str, repo: str, base_sha: str, head_sha: str, language: str, config_digest: str,
+               author: str) -> str:
+    """
+    检查条件结果的缓存键
+    :param base_sha: 合入分支 commit
+    :param head_sha: PR 最新 commit
+    :param language: checklist 语言, zh / en
+    :param config_digest: checklist 配置文件内容的 sha256
+    :param author: pr 作者, committer-change 的结果与作者有关
+    :return:
+    """
+    raw = "\0".join([owner, repo, base_sha, head_sha, language, config_digest, author or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_result(key: str) -> dict | None:
+    """
+    查询缓存的检查条件结果, 命中时更新访问时间
+    :return: dict(conditions: 条件结果, conflicts: 冲突文件), 未命中或数据库异常时返回 None
+    """
+    try:
+        item = ChecklistResult.objects.filter(key=key).values("conditions", "conflicts").first()
+        if item is not None:
+            ChecklistResult.objects.filter(key=key).update(accessed_at=timezone.now())
+    except DatabaseError as err:
+        logging.error(f"get checklist result {key} failed: {err}")
+        RESULT_CACHE_TOTAL.inc(result="error")
+        return None
+
+    RESULT_CACHE_TOTAL.inc(result="hit" if item is not None else "miss")
+    return item
+
+
+def put_result(key: str, max_entries: int, **fields):
+    """
+    保存检查条件结果, 超过最大条目数时淘汰最久未访问的结果
+    :param key: result_key 的返回值
+    :param max_entries: 最大条目数
+    :param fields: ChecklistResult 的其余字段
+    """
+    try:
+        ChecklistResult.objects.update_or_create(key=key, defaults=dict(fields, accessed_at=timezone.now()))
+
+        overflow = ChecklistResult.objects.count() - max_entries
+        if overflow > 0:
+            stale = ChecklistResult.objects.order_by("accessed_at").values_list("id", flat=True)[:overflow]
+            ChecklistResult.objects.filter(id__in=list(stale)).delete()
+    except DatabaseError as err:
+        logging.error(f"save checklist result {key} failed: {err}")
@@ -1,18 +1,34 @@
 #!-*- utf-8 -*-
 
 import logging
+import os
 import re
-from multiprocessing import Process
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 
+from business.checklist import get_checklist
+from business.conditions import NEED_PR_SIG_INFO, resolve
+from business.result_cache import result_key, get_result, put_result
+from business.sig_index import SigIndex, committer_repos, get_sig_index
+from business.worker import get_worker_pool
+from business.workspace import get_workspace_manager
 from common.gitcode import GitcodeApp
-from common.func import has_chinese_regex, load_yaml, exec_cmd
+from common.metrics import JOB_SECONDS, STAGE_SECONDS
+from common.func import has_chinese_regex, parse_yaml, exec_cmd, load_json, save_json, StageTimer, \
+    CmdStream
+from common.git import DiffSnapshot, GitObjectReader, SNAPSHOT_DIFF_ARGS, BLOBLESS_DIFF_ARGS, iter_patches, \
+    merge_tree, diff_tree, ls_remote
 from common.config import CheckListHeader_ZH, Category_ZH, CheckListHeader_EN, Category_EN, FAILURE_COMMENT, \
-    PR_CONFLICT_COMMENT, REVIEW_STATUS, WaitConFirmLabel
+    PR_CONFLICT_COMMENT, REVIEW_STATUS, WaitConFirmLabel, GIT_BASE_URL
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
 
+# .spec 文件中检查是否修改的字段
+SPEC_KEYWORDS = ("License", "Version")
+
 
 class PRHandlerService:
 
@@ -33,7 +49,28 @@ class PRHandlerService:
         self.root_dir = settings.BASE_DIR  # 项目根目录
         self.config_path = f"{self.root_dir}/config/reviewer_checklist_zh.yaml"  # 配置文件路径
         self.line_id = 0  # checklist item id
-        self.repo_dir = f"{self.root_dir}/data/{self.owner}_{self.repo}_{self.pr_id}"  # 代码下载目录
+        self.env_mode = settings.ENV_MODE  # 代码环境模式, full / blobless
+        self.workspaces = get_workspace_manager()  # data 目录管理
+        self.mirror_dir = self.workspaces.mirror_dir(owner, repo, self.env_mode)  # 仓库镜像目录, 多个PR共用
+        self.repo_url = f"{GIT_BASE_URL}/{self.owner}/{self.repo}.git"  # 代码仓地址
+        self.state_path = self.workspaces.state_path(owner, repo, pr_id)  # 上次评估状态
+        self.index_path = self.workspaces.index_path(owner, repo)  # master 分支 sig 索引
+        self.branch = ""  # 合入分支
+        self.base_sha = ""  # 合入分支 commit
+        self.head_sha = ""  # PR 最新 commit
+        self.merge_base = ""  # 合入分支与 PR 的合并基点, 仅 blobless 模式
+        self.merged_tree = ""  # PR 合入后的目录树
+        self.conflicts = []  # PR 合入时冲突的文件
+        self.conditions = {}  # 检查条件结果, key: 条件, value: 结果
+        self.diff_snapshots = {}  # 本次任务的 diff 快照, key: 对比分支
+        self.spec_changes = {}  # .spec 文件字段是否修改, key: 对比分支, value: dict(字段: 是否修改)
+        self.object_reader = None  # git 对象读取器, 按需创建
+        self.sig_index = None  # master 分支 sig 索引, 按需加载
+        self.timer = StageTimer()  # 各阶段耗时
+        self.condition_workers = settings.CONDITION_WORKERS  # 并发计算检查条件的线程数
+        self.result_cache_size = settings.RESULT_CACHE_SIZE  # 检查条件结果缓存的最大条目数, 0 表示不缓存
+        self._locks = {}  # 按需加载的数据的锁, 并发计算条件时同一数据只加载一次
+        self._locks_lock = threading.Lock()
 
         self.gitcode_app = GitcodeApp(owner, repo, access_token)
 
@@ -51,20 +88,177 @@ class PRHandlerService:
             self.category = Category_EN
             self.config_path = f"{self.root_dir}/config/reviewer_checklist_en.yaml"
 
+    @property
+    def git_dir(self) -> str:
+        """
+        代码所在的 git 仓库, 直接使用镜像仓, 不创建工作区
+        """
+        return self.mirror_dir
+
+    def load_lock(self, key) -> threading.Lock:
+        """
+        按需加载数据 key 的锁
+        """
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_object_reader(self) -> GitObjectReader:
+        if self.object_reader is None:
+            with self.load_lock("object_reader"):
+                if self.object_reader is None:
+                    self.object_reader = GitObjectReader(self.git_dir)
+        return self.object_reader
+
+    def master_rev(self) -> str:
+        """
+        master 分支版本
+        """
+        return self.base_sha if self.branch == "master" else "refs/heads/master"
+
+    def diff_cmd(self, branch: str, args: str, files: str = "") -> list[str]:
+        """
+        git_diff.sh 命令: 对比合入分支与 PR 合入后的目录树
+        :param branch: 合入分支
+        :param args: git diff 参数
+        :param files: 只对比的文件, 多个文件用空格分割
+        """
+        git_dir = self.git_dir
+        cmd = [f"{self.root_dir}/tools/git_diff.sh", os.path.basename(git_dir), branch, os.path.dirname(git_dir),
+               args, files]
+        base = self.base_sha if branch == self.branch else f"refs/heads/{branch}"
+        cmd.append(f"{base} {self.merged_tree}")
+        return cmd
+
+    def load_pr_yaml(self, path: str) -> dict:
+        """
+        加载 PR 合入后的 yaml 文件
+        :param path: 仓库相对路径
+        :return:
+        """
+        content = self.get_object_reader().read(self.merged_tree, path)
+        return parse_yaml(content) if content else {}
+
+    def load_diff_snapshot(self, branch: str) -> DiffSnapshot | None:
+        """
+        执行 git diff 生成与合入分支的 diff 快照
+        :param branch: 合入分支
+        :return: diff 快照, 获取失败返回 None
+        """
+        cmd = self.diff_cmd(branch, BLOBLESS_DIFF_ARGS if self.env_mode == "blobless" else SNAPSHOT_DIFF_ARGS)
+        with self.timer.stage("diff"), CmdStream(cmd, separator="\0") as stream:
+            snapshot = DiffSnapshot.parse_tokens(stream)
+        if stream.code != 0:
+            logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get git diff snapshot failed")
+            return None
+        return snapshot
+
+    def get_diff_snapshot(self, branch: str) -> DiffSnapshot | None:
+        """
+        获取与合入分支的 diff 快照, 同一分支只执行一次 git diff
+        :param branch: 合入分支
+        :return: diff 快照, 获取失败返回 None
+        """
+        if branch not in self.diff_snapshots:
+            with self.load_lock(("diff", branch)):
+                if branch not in self.diff_snapshots:
+                    self.diff_snapshots[branch] = self.load_diff_snapshot(branch)
+
+        return self.diff_snapshots[branch]
+
+    def name_status(self, branch: str) -> list[str]:
+        """
+        与 git diff --name-status 输出一致的变动文件列表
+        :param branch: 对比分支
+        :return: 获取失败返回空列表
+        """
+        snapshot = self.get_diff_snapshot(branch)
+        return snapshot.name_status() if snapshot is not None else []
+
+    def load_spec_changes(self, branch: str) -> dict[str, bool] | None:
+        """
+        流式扫描所有被修改的 .spec 文件的 diff, 检查 SPEC_KEYWORDS 中的字段是否修改
+        每个字段按文件顺序检查, 遇到第一个修改了该字段, 或该字段修改行不是恰好两行的文件即确定结果;
+        只保留字段所在的 diff 行, 所有字段都确定后不再读取剩余的 diff
+        :param branch: 合入分支
+        :return: key: 字段, value: 是否修改; 获取失败返回 None
+        """
+        snapshot = self.get_diff_snapshot(branch)
+        if snapshot is None:
+            return None
+
+        result = {x: None for x in SPEC_KEYWORDS}  # None 表示尚未确定
+        spec_files = [x for x in snapshot.filter("M") if x.endswith(".spec")]
+        if not spec_files:
+            return {x: False for x in SPEC_KEYWORDS}
+
+        # 不需要上下文, 只输出修改的行
+        cmd = self.diff_cmd(branch, "-U0", " ".join(spec_files))
+        keep = re.compile(f"^[+-]({'|'.join(SPEC_KEYWORDS)})")
+        with self.timer.stage("diff"), CmdStream(cmd) as stream:
+            for _, diffs in iter_patches(stream, keep):
+                for keyword in SPEC_KEYWORDS:
+                    if result[keyword] is None:
+                        changed = self.spec_field_changed(diffs, keyword)
+                        if changed is None:
+                            # 字段修改行不是恰好两行时不再检查后续文件
+                            result[keyword] = False
+                        elif changed:
+                            result[keyword] = True
+                if all(x is not None for x in result.values()):
+                    break
+
+        if stream.code != 0:
+            logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get spec files diff failed")
+            return None
+        return {k: bool(v) for k, v in result.items()}
+
+    def get_spec_changes(self, branch: str) -> dict[str, bool] | None:
+        """
+        获取 .spec 文件字段的修改情况, 同一分支只扫描一次
+        :param branch: 合入分支
+        :return: 同 load_spec_changes
+        """
+        if branch not in self.spec_changes:
+            with self.load_lock(("spec", branch)):
+                if branch not in self.spec_changes:
+                    self.spec_changes[branch] = self.load_spec_changes(branch)
+
+        return self.spec_changes[branch]
+
+    @staticmethod
+    def spec_field_changed(diffs: list[str], keyword: str) -> bool | None:
+        """
+        单个 .spec 文件的 diff 中字段的值是否修改
+        :param diffs: 文件的 diff 行
+        :param keyword: 字段, eg: License
+        :return: 字段修改行不是恰好两行时返回 None
+        """
+        diff_lines = [x for x in diffs if re.match(f"^[+-]{keyword}", x)]
+        if len(diff_lines) != 2:
+            return None
+
+        cur_value, old_value = "", ""
+        for diff_line in diff_lines:
+            if diff_line.startswith(f"+{keyword}:"):
+                cur_value = diff_line.split(":")[1].strip()
+            elif diff_line.startswith(f"-{keyword}:"):
+                old_value = diff_line.split(":")[1].strip()
+
+        return cur_value != old_value
+
     def check_programing_language(self, branch) -> dict:
         """
         检测编程语言类别
         :return: dict, key: 编程语言,  value: 编程语言规范
         """
         result = {}
-        cmd = [f"{self.root_dir}/tools/git_diff.sh", self.repo, branch, self.repo_dir, "--name-only"]
-        code, output = exec_cmd(cmd)
+        snapshot = self.get_diff_snapshot(branch)
 
-        if code != 0:
+        if snapshot is None:
             logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get git diff files failed")
             return result
 
-        for item in output.splitlines():
+        for item in snapshot.names():
             if item.endswith(".py"):
                 result.update({"Python": "pylint-3"})
             elif item.endswith(".go"):
@@ -80,12 +274,11 @@ class PRHandlerService:
         :param branch:
         :return:
         """
-        cmd = [f"{self.root_dir}/tools/git_diff.sh", self.repo, branch, self.repo_dir, "--name-only --diff-filter=A"]
-        code, output = exec_cmd(cmd)
-        if code != 0:
+        snapshot = self.get_diff_snapshot(branch)
+        if snapshot is None:
             logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get git add files failed")
             return False
-        return bool(output.splitlines())
+        return bool(snapshot.filter("A"))
 
     def has_modify_spec_file(self,
                              branch: str,
@@ -97,35 +290,12 @@ class PRHandlerService:
         :param keyword:
         :return:
         """
-        cmd = [f"{self.root_dir}/tools/git_diff.sh", self.repo, branch, self.repo_dir, "--name-only --diff-filter=M"]
-        code, output = exec_cmd(cmd)
-        if code != 0:
-            logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get git add files failed")
+        changes = self.get_spec_changes(branch)
+        if changes is None:
+            logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get spec files diff failed")
             return False
 
-        for file_name in output.splitlines():
-            if file_name.endswith(".spec"):
-                cmd = [f"{self.root_dir}/tools/git_diff.sh", self.repo, branch, self.repo_dir, "", file_name]
-
-                code, diffs = exec_cmd(cmd)
-                if code != 0:
-                    logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: get files {file_name} diff failed")
-                    return False
-
-                diff_lines = [x for x in diffs.splitlines() if re.match(f"^[+-]{keyword}", x)]
-                if len(diff_lines) != 2:
-                    break
-
-                cur_value, old_value = "", ""
-                for diff_line in diff_lines:
-                    if diff_line.startswith(f"+{keyword}:"):
-                        cur_value = diff_line.split(":")[1].strip()
-                    elif diff_line.startswith(f"-{keyword}:"):
-                        old_value = diff_line.split(":")[1].strip()
-
-                if cur_value != old_value:
-                    return True
-        return False
+        return changes.get(keyword, False)
 
     def format_checklist_item(self,
                               category: str,
@@ -147,89 +317,73 @@ class PRHandlerService:
         return res
 
     def basic_review(self,
-                     checklist: dict,
+                     checklist: tuple,
                      branch: str,
                      ) -> str:
         """
         基础检查项
-        :param checklist: yaml.load -> config.review_checklist_**.yaml .basic部分
+        :param checklist: 编译后的 config.review_checklist_**.yaml .basic部分
         :param branch: 合入分支
         :return: checklist 内容
         """
-        if not checklist:
-            return ""
-
         res = []
-        for review_type, items in checklist.items():
-            category = self.category.get(review_type)
-            for item in items:
-                condition, name = item.get("condition"), item.get("name")
-                claim, explain = item.get("claim"), item.get("explain")
-                # 添加静态检查 item
-                if condition == "code-modified" and name == "static-check":
-                    _dict = self.check_programing_language(branch)
-
-                    if not _dict:
-                        continue
+        for item in checklist:
+            condition, category = item.condition, item.category
+            # 添加静态检查 item
+            if condition == "code-modified" and item.name == "static-check":
+                _dict = self.conditions.get("code-modified")
 
-                    _lg, _er = "/".join(_dict.keys()), "/".join(_dict.values())
-                    line = self.format_checklist_item(category, claim, explain)
-                    res.append(line.format(lang=_lg, checker=_er))
-                # 是否有新增文件
-                elif condition == "new-file-add" and not self.has_add_file(branch):
-                    continue
-                elif condition == "license-change" and not self.has_modify_spec_file(branch, "License"):
-                    continue
-                elif condition == "version-change" and branch == "master" and not \
-                        self.has_modify_spec_file(branch, "Version"):
+                if not _dict:
                     continue
-                else:
-                    line = self.format_checklist_item(category, claim, explain)
-                    res.append(line)
+
+                _lg, _er = "/".join(_dict.keys()), "/".join(_dict.values())
+                line = self.format_checklist_item(category, item.claim, item.explain)
+                res.append(line.format(lang=_lg, checker=_er) if item.placeholders else line)
+            # 是否有新增文件
+            elif condition == "new-file-add" and not self.conditions.get("new-file-add"):
+                continue
+            elif condition == "license-change" and not self.conditions.get("license-change"):
+                continue
+            elif condition == "version-change" and branch == "master" and not \
+                    self.conditions.get("version-change"):
+                continue
+            else:
+                line = self.format_checklist_item(category, item.claim, item.explain)
+                res.append(line)
 
         return "".join(res)
 
     def src_openeuler_review(self,
-                             checklist: dict,
+                             checklist: tuple,
                              branch: str
                              ) -> str:
         """
 
-        :param checklist: yaml.load -> config.review_checklist_**.yaml .src-openeuler部分
+        :param checklist: 编译后的 config.review_checklist_**.yaml .src-openeuler部分
         :param branch: 合入分支
         :return: checklist 内容
         """
         res = []
-        for review_type, items in checklist.items():
-            category = self.category.get(review_type)
-
-            for item in items:
-                claim, explain, name = item.get("claim"), item.get("explain"), item.get("name")
-
-                if name == "PR-latest-version" and branch == "master":
-                    continue
+        for item in checklist:
+            if item.name == "PR-latest-version" and branch == "master":
+                continue
 
-                line = self.format_checklist_item(category, claim, explain)
-                res.append(line)
+            line = self.format_checklist_item(item.category, item.claim, item.explain)
+            res.append(line)
 
         return "".join(res)
 
-    def load_remote_yaml(self, path: str) -> dict:
+    def get_sig_index(self) -> SigIndex:
         """
-        加载 remote path路径下yaml文件
-        :param path: 仓库相对路径
+        获取 master 分支的 sig 索引, 多个 PR 共用, master 有更新时增量更新
         :return:
         """
-        # 切换到master分支， 并加载master分支sig信息, 再恢复环境
-        cmd = [f"{self.root_dir}/tools/git_checkout.sh", self.repo, "master", self.repo_dir]
-        _, _ = exec_cmd(cmd)
+        if self.sig_index is None:
+            with self.load_lock("sig_index"):
+                if self.sig_index is None:
+                    self.sig_index = get_sig_index(self.get_object_reader(), self.master_rev(), self.index_path)
 
-        remote_sig_info = load_yaml(f"{self.repo_dir}/{path}")
-
-        cmd = [f"{self.root_dir}/tools/git_checkout.sh", self.repo, f"tmp_pr_{self.pr_id}", self.repo_dir]
-        _, _ = exec_cmd(cmd)
-
-        return remote_sig_info
+        return self.sig_index
 
     def maintainer_changed_sigs(self, diff_files: list[str]) -> dict:
         """
@@ -239,19 +393,17 @@ class PRHandlerService:
         """
         sigs = {}
         for line in diff_files:
-            status, file = re.split(r"\s+", line)
+            status, *_, file = line.split("\t")
             if status != "M":
                 continue
 
             if file.startswith("sig/") and file.endswith("/sig-info.yaml"):
                 sig_name = file.split("/")[1]
-                sig_info = load_yaml(f"{self.repo_dir}/{file}")
+                sig_info = self.load_pr_yaml(file)
                 maintainers = sig_info.get("maintainers", [])
                 maintainer_ids = [x.get("gitee_id") for x in maintainers]  # todo
 
-                remote_sig_info = self.load_remote_yaml(file)
-                remote_maintainers = remote_sig_info.get("maintainers", [])
-                remote_maintainer_ids = [x.get("gitee_id") for x in remote_maintainers]  # todo
+                remote_maintainer_ids = self.get_sig_index().maintainers(sig_name)
 
                 if set(maintainer_ids) != set(remote_maintainer_ids):
                     owners = [f"@{x}" for x in remote_maintainer_ids]
@@ -268,7 +420,7 @@ class PRHandlerService:
         """
         sigs = {}
         for line in diff_files:
-            status, file = re.split(r"\s+", line)
+            status, *_, file = line.split("\t")
             if status not in ["A", "M"] or file == "sig/sigs.yaml" or not file.startswith("sig/"):
                 continue
 
@@ -277,10 +429,7 @@ class PRHandlerService:
             if sig_name == "sig-template":
                 continue
 
-            remote_sig_info = self.load_remote_yaml(f"sig/{sig_name}/sig-info.yaml")
-
-            remote_maintainers = remote_sig_info.get("maintainers", [])
-            remote_maintainer_ids = [x.get("gitee_id") for x in remote_maintainers]  # todo
+            remote_maintainer_ids = self.get_sig_index().maintainers(sig_name)
 
             owners = [f"@{x}" for x in remote_maintainer_ids]
             sigs[sig_name] = owners
@@ -295,7 +444,7 @@ class PRHandlerService:
         :return:
         """
         for line in diff_files:
-            status, file = re.split(r"\s+", line)
+            status, *_, file = line.split("\t")
 
             if status == "A" and file.startswith("sig") and file.endswith(".yaml") and len(file.split("/")) == 5 \
                     and file.split("/")[2] in ["openeuler", "src-openeuler"]:
@@ -351,40 +500,21 @@ class PRHandlerService:
         # todo
         return res
 
-    def committer_change(self,
-                         diff_files: list,
-                         category: str,
-                         claim: str,
-                         explain: str,
-                         author: str) -> list:
+    def committer_change(self, diff_files: list, author: str) -> list:
         """
         committer 有变更
         :param diff_files: 有变动的文件名称列表
-        :param category: checklist 类别
-        :param claim: item.claim
-        :param explain: item.explain
         :param author: pr 作者
-        :return:
+        :return: 有变更的 committer id 列表
         """
-
-        def _deal_with_commit(repo_inf: list, res_map: dict):
-            """
-            处理后的 res_map key: git id, value: repos
-            """
-            for item in repo_inf:
-                _repos, _committers = item.get("repo", []), item.get("committers", [])
-                [res_map.setdefault(x.get("gitee_id"), []).extend(_repos) for x in _committers]
-
         changed_committer_ids = set()
         for line in diff_files:
-            status, file = re.split(r"\s+", line)
-            committer_map, remote_committer_map = dict(), dict()
+            status, *_, file = line.split("\t")
             if status != "M" and file.startswith("sig/") and file.endswith("/sig-info.yaml"):
-                repo_info: list = load_yaml(file).get("repositories", [])
-                remote_repo_info: list = self.load_remote_yaml(file).get("repositories", [])
-
-                _deal_with_commit(repo_info, committer_map)
-                _deal_with_commit(remote_repo_info, remote_committer_map)
+                # 删除的文件在工作区中已不存在
+                repo_info = [] if status == "D" else self.load_pr_yaml(file).get("repositories", [])
+                committer_map = committer_repos(repo_info)
+                remote_committer_map = self.get_sig_index().committers(file.split("/")[1])
 
                 for committer, repos in committer_map.items():
                     remote_repos = remote_committer_map.get(committer, [])
@@ -396,83 +526,193 @@ class PRHandlerService:
                     if sorted(repos) != sorted(remote_repos):
                         changed_committer_ids.add(remote_committer)
 
-        changed_committer_ids.remove(author) if author in changed_committer_ids else None
+        changed_committer_ids.discard(author)
 
-        return [self.format_checklist_item(category, claim, explain).format(committer=x) for x in changed_committer_ids]
+        return sorted(changed_committer_ids)
 
-    def community_review(self, checklist: dict, author: str) -> str:
+    def community_review(self, checklist: tuple) -> str:
         """
         定制化checklist, 仅针对 openeuler/community 仓
-        :param author: pr作者 gitcode id
-        :param checklist:  yaml.load -> config.review_checklist_**.yaml .customization部分
+        :param checklist:  编译后的 config.review_checklist_**.yaml .customization部分中当前仓库的条目
         :return:
         """
         res = []
 
-        cmd = [f"{self.root_dir}/tools/git_diff.sh", self.repo, "master", self.repo_dir, "--name-status", ""]
-        _, diff_files = exec_cmd(cmd)
-
-        lines = diff_files.splitlines()
-        maintainer_changed_sigs = self.maintainer_changed_sigs(lines)
-        sig_info_changed_sigs = self.sig_info_changed(lines)
-        is_repo_add = self.is_repo_add(lines)
-        is_recycle_sig_changed = self.sig_recycle_changed(lines)
-
-        category = self.category.get("customization")
-        for repo, items in checklist.items():  # 实际只有community仓
-            if self.repo != repo:
-                continue
-
-            for item in items:
-
-                condition, name = item.get("condition"), item.get("name")
-                claim, explain = item.get("claim"), item.get("explain")
-                # 新增or删除 sig maintainer
-                if condition == "maintainer-change" and maintainer_changed_sigs:
-                    if name == "maintainer-add-explain":
-                        res.append(self.format_checklist_item(category, claim, explain))
-                    elif name == "maintainer-change-lgtm":
-                        for _sig, _maintainers in maintainer_changed_sigs.items():
-                            res.append(self.format_checklist_item(category, claim, explain).format(sig=_sig,
-                                                                                                   owners=_maintainers))
-                # sig 有变动
-                elif condition == "sig-update" and sig_info_changed_sigs:
-                    for _sig, _maintainers in sig_info_changed_sigs.items():
-                        if _sig in maintainer_changed_sigs.keys() or _sig == "sig-template":
-                            continue
+        maintainer_changed_sigs = self.conditions.get("maintainer-change", {})
+        sig_info_changed_sigs = self.conditions.get("sig-update", {})
+        is_repo_add = self.conditions.get("repo-introduce")
+        is_recycle_sig_changed = self.conditions.get("repo-blacklist-change")
+
+        for item in checklist:  # 实际只有community仓
+            condition, name, category = item.condition, item.name, item.category
+            claim, explain = item.claim, item.explain
+            # 新增or删除 sig maintainer
+            if condition == "maintainer-change" and maintainer_changed_sigs:
+                if name == "maintainer-add-explain":
+                    res.append(self.format_checklist_item(category, claim, explain))
+                elif name == "maintainer-change-lgtm":
+                    for _sig, _maintainers in maintainer_changed_sigs.items():
                         res.append(self.format_checklist_item(category, claim, explain).format(sig=_sig,
                                                                                                owners=_maintainers))
-                # repo.yaml 新增或者变动
-                elif condition == "repo-introduce" and is_repo_add:
-                    res.append(self.format_checklist_item(category, claim, explain))
-                elif condition == "sanity_check":
-                    pass  # todo
-                elif condition == "repo-ownership-change":
-                    self.repo_sig_change(item)  # todo
-                elif condition == "new-branch-add":
-                    pass  # todo
-                elif condition == "new-members-add":
-                    pass  # todo
-                # 文件被删除或移除至 sig-recycle
-                elif condition == "repo-blacklist-change" and is_recycle_sig_changed:
-                    res.append(self.format_checklist_item(category, claim, explain))
-                elif condition == "sig-info-change":
-                    pass  # 应该和sig-update有重合
-                elif condition == "committer-change":
-                    res.extend(self.committer_change(lines, category,  claim, explain, author))
+            # sig 有变动
+            elif condition == "sig-update" and sig_info_changed_sigs:
+                for _sig, _maintainers in sig_info_changed_sigs.items():
+                    if _sig in maintainer_changed_sigs.keys() or _sig == "sig-template":
+                        continue
+                    res.append(self.format_checklist_item(category, claim, explain).format(sig=_sig,
+                                                                                           owners=_maintainers))
+            # repo.yaml 新增或者变动
+            elif condition == "repo-introduce" and is_repo_add:
+                res.append(self.format_checklist_item(category, claim, explain))
+            elif condition == "sanity_check":
+                pass  # todo
+            elif condition == "repo-ownership-change":
+                self.repo_sig_change(item)  # todo
+            elif condition == "new-branch-add":
+                pass  # todo
+            elif condition == "new-members-add":
+                pass  # todo
+            # 文件被删除或移除至 sig-recycle
+            elif condition == "repo-blacklist-change" and is_recycle_sig_changed:
+                res.append(self.format_checklist_item(category, claim, explain))
+            elif condition == "sig-info-change":
+                pass  # 应该和sig-update有重合
+            elif condition == "committer-change":
+                for _committer in self.conditions.get("committer-change", []):
+                    res.append(self.format_checklist_item(category, claim, explain).format(committer=_committer))
 
         return "".join(res)
 
+    def changed_files(self, branch: str, previous: dict) -> set[str] | None:
+        """
+        与上次评估的 diff 快照相比, 有变化的文件
+        :param branch: 对比分支
+        :param previous: 上次评估状态
+        :return: 有变化的文件路径, 无法比较时返回 None
+        """
+        records = previous.get("snapshots", {}).get(branch)
+        snapshot = self.get_diff_snapshot(branch)
+        if records is None or snapshot is None:
+            return None
+
+        return snapshot.changed_paths(records)
+
+    def evaluate_conditions(self, branch: str, author: str, previous: dict) -> dict:
+        """
+        计算当前 checklist 引用的检查条件, 每个条件最多计算一次, 只获取这些条件依赖的数据
+        输入文件与上次评估相比没有变化的条件, 直接复用上次的结果; 其余条件相互独立, 在线程池中并发计算
+        :param branch: 合入分支
+        :param author: pr 作者
+        :param previous: 上次评估状态, 为空时全部重新计算
+        :return: key: 条件, value: 条件结果
+        """
+        results, changed, pending = {}, {}, []
+        prev_results = previous.get("conditions", {})
+        base_changed = previous.get("base_sha") != self.base_sha
+
+        checklist = get_checklist(self.config_path, self.category)
+        conditions = resolve(checklist.active_conditions(self.owner, self.repo))
+        needs = frozenset().union(*(x.needs for x in conditions))
+
+        if self.env_mode == "blobless" and NEED_PR_SIG_INFO in needs:
+            # 一次获取 PR 中所有 sig-info.yaml 的内容
+            snapshot = self.get_diff_snapshot("master")
+            paths = [x.path for x in snapshot.entries if x.status[0] != "D" and x.path.endswith("/sig-info.yaml")] \
+                if snapshot is not None else []
+            self.get_object_reader().prefetch(self.merged_tree, paths)
+
+        for condition in conditions:
+            diff_branch = condition.diff_branch(branch)
+            if diff_branch not in changed:
+                changed[diff_branch] = self.changed_files(diff_branch, previous)
+
+            files = changed[diff_branch]
+            if condition.name in prev_results and files is not None and not any(condition.inputs(x) for x in files) \
+                    and not (base_changed and condition.base_dependent):
+                results[condition.name] = prev_results[condition.name]
+            else:
+                pending.append(condition)
+
+        def evaluate(condition):
+            with self.timer.stage(f"condition:{condition.name}"):
+                return condition.evaluate(self, branch, author)
+
+        workers = min(len(pending), self.condition_workers)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="condition") as executor:
+                values = list(executor.map(evaluate, pending))
+        else:
+            values = [evaluate(x) for x in pending]
+        results.update(zip((x.name for x in pending), values))
+
+        logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: evaluate {len(pending)} conditions, "
+                     f"reuse {len(results) - len(pending)} conditions")
+        # 与串行计算时的顺序一致
+        return {x.name: results[x.name] for x in conditions}
+
+    def remote_shas(self, branch: str) -> tuple[str, str]:
+        """
+        远端合入分支与 PR 的最新提交, 与 prepare_env 获取的引用一致, 不获取任何对象
+        :param branch: 合入分支
+        :return: tuple(合入分支 commit, PR 最新 commit), 获取失败时为空字符串
+        """
+        base_ref, head_ref = f"refs/heads/{branch}", f"refs/merge-requests/{self.pr_id}/head"
+        refs = ls_remote(self.repo_url, [base_ref, head_ref]) or {}
+        return refs.get(base_ref, ""), refs.get(head_ref, "")
+
+    def result_key(self, branch: str, base_sha: str, head_sha: str, author: str) -> str | None:
+        """
+        检查条件结果的缓存键
+        :param branch: 合入分支
+        :param base_sha: 合入分支 commit
+        :param head_sha: PR 最新 commit
+        :param author: pr 作者
+        :return: 不使用缓存时返回 None
+        """
+        if self.result_cache_size <= 0 or not base_sha or not head_sha:
+            return None
+
+        checklist = get_checklist(self.config_path, self.category)
+        conditions = resolve(checklist.active_conditions(self.owner, self.repo))
+        # 合入其他分支时, sig 相关条件还依赖 master 的最新提交, 准备环境前无法确定
+        if branch != "master" and any(x.base_dependent for x in conditions):
+            return None
+
+        return result_key(self.owner, self.repo, base_sha, head_sha, "zh" if self.is_cn else "en",
+                          checklist.digest, author)
+
+    def save_result(self, branch: str, author: str):
+        """
+        缓存本次计算的检查条件结果
+        :param branch: 合入分支
+        :param author: pr 作者
+        """
+        key = self.result_key(branch, self.base_sha, self.head_sha, author)
+        if key is None:
+            return
+
+        put_result(key,
+                   self.result_cache_size,
+                   owner=self.owner,
+                   repo=self.repo,
+                   base_sha=self.base_sha,
+                   head_sha=self.head_sha,
+                   language="zh" if self.is_cn else "en",
+                   config_digest=get_checklist(self.config_path, self.category).digest,
+                   conditions=self.conditions,
+                   conflicts=self.conflicts,
+                   )
+
     def generate_checklist(self, pr_detail: dict) -> str:
         """
-        生成 review checklist列表
+        生成 review checklist列表, 需要先计算检查条件 self.conditions
         :params pr_detail: pr详情, json
         :return: review comment内容
         """
         branch = pr_detail.get("base", {}).get("label")
-        author = pr_detail.get("user", {}).get("login")
 
-        if not pr_detail.get("mergeable"):
+        # 接口返回的 mergeable 或本地合并存在冲突
+        if not pr_detail.get("mergeable") or self.conflicts:
             return PR_CONFLICT_COMMENT.format(owner=pr_detail.get("user", {}).get("login"))
 
         # review header
@@ -482,33 +722,95 @@ class PRHandlerService:
                                               question=REVIEW_STATUS['question'],
                                               ongoing=REVIEW_STATUS['ongoing'])
 
-        checklist = load_yaml(self.config_path)
+        checklist = get_checklist(self.config_path, self.category)
         # 常规检查，对应checklist basic部分
-        review += self.basic_review(checklist.get("basic"), branch)
+        with self.timer.stage("generate:basic"):
+            review += self.basic_review(checklist.basic, branch)
         # src-openeuler的检查，对应checklist src-openeuler部分
         if self.owner == "src-openeuler":
-            review += self.src_openeuler_review(checklist.get("src-openeuler", {}), branch)
-        # 定制化检查
-        review += self.community_review(checklist.get("customization", {}), author)
+            with self.timer.stage("generate:src-openeuler"):
+                review += self.src_openeuler_review(checklist.src_openeuler, branch)
+        # 定制化检查, 只有配置了定制项的仓库才需要
+        customization = checklist.customization.get(self.repo)
+        if customization:
+            with self.timer.stage("generate:customization"):
+                review += self.community_review(customization)
 
         return review
 
-    def delete_old_checklist(self):
+    @staticmethod
+    def keep_review_status(old_body: str, new_body: str) -> str:
         """
-        获取所有历史checklist, 并删除
+        保留旧 checklist 中内容未变化条目的审视结果, 只有新增或变化的条目使用新的审视结果
+        :param old_body: 当前 checklist 评论内容
+        :param new_body: 新生成的 checklist 内容
         :return:
         """
-        comments = self.gitcode_app.get_pr_all_comments(self.pr_id)
+        # 条目格式: |编号|类别|要求|说明|结果|, 以 类别|要求|说明 作为条目标识
+        status = {}
+        for line in old_body.splitlines():
+            if re.match(r"^\|\d+\|", line):
+                content, value = line.rstrip("|").rsplit("|", 1)
+                status[content.split("|", 2)[2]] = value
+
+        res = []
+        for line in new_body.splitlines(keepends=True):
+            if re.match(r"^\|\d+\|", line):
+                content = line.rstrip("\n").rstrip("|").rsplit("|", 1)[0]
+                key = content.split("|", 2)[2]
+                if key in status:
+                    line = f"{content}|{status[key]}|\n"
+            res.append(line)
+
+        return "".join(res)
+
+    def reconcile_checklist(self, comment: str, keep_status: bool = False) -> bool:
+        """
+        同步 checklist 评论: 原地编辑最新的 checklist, 内容未变化时不做更新, 并并发删除其余历史 checklist
+        冲突提示等非 checklist 评论: 已有相同内容的评论时不再重复发表, 并删除其余重复的评论
+        只处理机器人账号发表的评论, 引用 checklist 的其他评论不会被编辑或删除
+        :param comment: 评论内容
+        :param keep_status: 是否保留未变化条目的审视结果
+        :return: 是否同步成功
+        """
         key = self.checklist_header[3:47]
-        flag = False
-        for comment in comments:
-            body = comment.get("body", "")
-            if key in body and not flag:
-                flag = True
-                continue
-            elif key in body and flag:
-                comment_id = comment.get("id")
-                self.gitcode_app.delete_comment(comment_id)
+        login = self.gitcode_app.get_login()
+        if login is None:
+            # 无法确认评论作者时不编辑或删除任何评论
+            return self.gitcode_app.create_comment(self.pr_id, comment)
+
+        # 评论按时间降序, 第一个即为最新的评论
+        comments = [x for x in self.gitcode_app.iter_pr_comments(self.pr_id)
+                    if (x.get("user") or {}).get("login") == login]
+        checklists = [x for x in comments if key in x.get("body", "")]
+        current, stale = (checklists[0], checklists[1:]) if checklists else (None, [])
+
+        if key not in comment:
+            # 本次不是 checklist(如冲突提示), 只保留最新的一条相同评论
+            notices = [x for x in comments if x.get("body", "").strip() == comment.strip()]
+            if notices:
+                logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: comment already exists, skip create")
+                success = True
+            else:
+                success = self.gitcode_app.create_comment(self.pr_id, comment)
+            stale += notices[1:]
+        else:
+            if current is not None and keep_status:
+                comment = self.keep_review_status(current.get("body", ""), comment)
+
+            if current is None:
+                success = self.gitcode_app.create_comment(self.pr_id, comment)
+            elif current.get("body", "").strip() == comment.strip():
+                logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: checklist unchanged, skip update")
+                success = True
+            else:
+                success = self.gitcode_app.edit_comment(current.get("id"), comment)
+
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(len(stale), self.gitcode_app.pool_size)) as executor:
+                list(executor.map(self.gitcode_app.delete_comment, [x.get("id") for x in stale]))
+
+        return success
 
     def add_wait_confirm_label(self, comment: str):
         """
@@ -521,51 +823,172 @@ class PRHandlerService:
             if WaitConFirmLabel not in labels:
                 self.gitcode_app.add_pr_labels(self.pr_id, WaitConFirmLabel)
 
+    def prepare_env(self, branch: str) -> bool:
+        """
+        准备代码环境, 并记录合入分支和 PR 的最新 commit
+        :param branch: 合入分支
+        :return: 是否成功
+        """
+        self.branch = branch
+        cmd = [f"{self.root_dir}/tools/prepare_env.sh", self.owner, self.repo, str(self.pr_id), branch,
+               self.mirror_dir, self.repo_url, self.env_mode]
+
+        code, output = exec_cmd(cmd)
+        if code != 0:
+            return False
+
+        for line in output.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "base":
+                self.base_sha = value
+            elif key == "head":
+                self.head_sha = value
+            elif key == "merge_base":
+                self.merge_base = value
+
+        return self.merge_pr()
+
+    def merge_pr(self) -> bool:
+        """
+        在镜像仓的对象库中将 PR 合入合入分支, 得到合入后的目录树与冲突文件, 不创建工作区
+        :return: 是否成功
+        """
+        if self.env_mode == "blobless" and self.merge_base:
+            # 两边都修改的文件需要文件内容才能合并, 一次获取, 避免合并时逐个按需获取
+            ours = diff_tree(self.git_dir, self.merge_base, self.base_sha) or []
+            theirs = diff_tree(self.git_dir, self.merge_base, self.head_sha) or []
+            both = sorted({x[1] for x in ours} & {x[1] for x in theirs})
+            for rev in (self.merge_base, self.base_sha, self.head_sha):
+                self.get_object_reader().prefetch(rev, both)
+
+        result = merge_tree(self.git_dir, self.base_sha, self.head_sha)
+        if result is None:
+            logging.error(f"{self.owner}/{self.repo}/{self.pr_id}: merge pr failed")
+            return False
+
+        self.merged_tree, self.conflicts = result
+        if self.conflicts:
+            logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: conflicts in {', '.join(self.conflicts)}")
+        return True
+
+    def save_state(self):
+        """
+        保存本次评估状态, 供 PR 更新时增量计算
+        :return:
+        """
+        save_json(self.state_path, {
+            "base_sha": self.base_sha,
+            "head_sha": self.head_sha,
+            "conflicts": self.conflicts,
+            "snapshots": {k: v.records() for k, v in self.diff_snapshots.items() if v is not None},
+            "conditions": self.conditions,
+        })
+
+    def clean_up(self):
+        """
+        清除环境
+        :return:
+        """
+        if self.object_reader is not None:
+            self.object_reader.close()
+
     def run(self, action: str) -> bool:
         """
-        :params action: edit 编辑列表; create 创建列表
+        :params action: edit PR 更新, 基于上次评估状态增量更新列表; create 创建列表
         :return:
         """
-        pr_detail: dict = self.gitcode_app.get_pr_detail(self.pr_id)
+        start, success = time.perf_counter(), False
+        try:
+            # 任务执行期间镜像不会被淘汰
+            with self.workspaces.use(self.mirror_dir):
+                success = self.handle(action)
+            return success
+        finally:
+            self.clean_up()
+            JOB_SECONDS.observe(time.perf_counter() - start, action=action, result="success" if success else "failure")
+            for stage, cost in self.timer.stages.items():
+                STAGE_SECONDS.observe(cost, stage=stage)
+
+    def handle(self, action: str) -> bool:
+        """
+        执行 PR 检查
+        :params action: 同 run
+        :return:
+        """
+        with self.timer.stage("pr_detail"):
+            pr_detail: dict = self.gitcode_app.get_pr_detail(self.pr_id)
 
         if not pr_detail:
             return False
 
         self.choose_language(pr_detail)
 
-        if action == "edit":
-            pass
-        elif action == "create":
-            branch = pr_detail.get("base", {}).get("label")
-            if not branch:
-                logging.error("Get pr target branch failed, exit")
-                return False
+        branch = pr_detail.get("base", {}).get("label")
+        author = pr_detail.get("user", {}).get("login")
+        if not branch:
+            logging.error("Get pr target branch failed, exit")
+            return False
 
-            cmd = [f"{self.root_dir}/tools/prepare_env.sh", self.owner, self.repo, self.pr_id, branch, self.repo_dir]
+        previous = load_json(self.state_path) if action == "edit" else {}
+        if action == "edit" and not previous:
+            logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: no previous state, evaluate all conditions")
 
-            code, _ = exec_cmd(cmd)
-            if code != 0:
-                self.gitcode_app.create_comment(self.pr_id, FAILURE_COMMENT)
-                return False
+        # 接口返回的 sha 可能滞后, 以远端引用的最新提交判断能否复用结果, 与保存结果时使用的提交来源一致
+        base_sha, head_sha = "", ""
+        if pr_detail.get("mergeable"):
+            with self.timer.stage("ls_remote"):
+                base_sha, head_sha = self.remote_shas(branch)
 
-            # 生成评论内容
+        prepared = False
+        if not pr_detail.get("mergeable"):
+            pass  # 存在冲突, 直接提示
+        elif previous and base_sha and head_sha \
+                and (base_sha, head_sha) == (previous.get("base_sha"), previous.get("head_sha")):
+            # PR 与合入分支都没有新的提交, 直接使用上次的条件结果; 合入分支有更新时需要重新计算依赖合入分支的条件
+            self.conditions = previous.get("conditions", {})
+            self.conflicts = previous.get("conflicts", [])
+        else:
+            # 合入分支与 PR 都没有更新时(重新触发、重新打开、重复的 webhook), 直接使用缓存的条件结果
+            with self.timer.stage("result_cache"):
+                key = self.result_key(branch, base_sha, head_sha, author)
+                cached = get_result(key) if key else None
+
+            if cached is not None:
+                logging.info(f"{self.owner}/{self.repo}/{self.pr_id}: reuse cached condition results")
+                self.conditions, self.conflicts = cached["conditions"], cached["conflicts"]
+            else:
+                with self.timer.stage("prepare_env"):
+                    env_ready = self.prepare_env(branch)
+                if not env_ready:
+                    self.gitcode_app.create_comment(self.pr_id, FAILURE_COMMENT)
+                    return False
+                prepared = True
+                if not self.conflicts:
+                    self.conditions = self.evaluate_conditions(branch, author, previous)
+                with self.timer.stage("result_cache"):
+                    self.save_result(branch, author)
+
+        # 生成评论内容
+        with self.timer.stage("generate"):
             comment = self.generate_checklist(pr_detail)
 
-            # 评论 checklist
-            if not self.gitcode_app.create_comment(self.pr_id, comment):
-                return False
-
-            # 删除旧的 checklist
-            self.delete_old_checklist()
+        # 评论 checklist, 并删除多余的旧 checklist; 更新时保留未变化条目的审视结果
+        with self.timer.stage("reconcile"):
+            reconciled = self.reconcile_checklist(comment, keep_status=(action == "edit"))
+        if not reconciled:
+            return False
 
-            # 更新 wait_confirm 标签
+        # 更新 wait_confirm 标签
+        with self.timer.stage("label"):
             self.add_wait_confirm_label(comment)
 
-            # 清除环境
-            exec_cmd([f"{self.root_dir}/tools/clean_up.sh", self.repo_dir])
-            logging.info("push review list success")
+        if prepared:
+            with self.timer.stage("clean_up"):
+                self.save_state()
+                self.clean_up()
+        logging.info("push review list success")
 
-            return True
+        return True
 
 
 def call(owner: str,
@@ -575,14 +998,15 @@ def call(owner: str,
          action: str
          ) -> bool:
     """
+    执行 PR 检查任务, 非 DEBUG 模式下提交到 worker 池异步执行
+    :return: DEBUG 模式下为执行结果, 否则为是否成功入队并写入任务记录
     """
-    service = PRHandlerService(owner=owner,
-                               repo=repo,
-                               access_token=access_token,
-                               pr_id=pr_id
-                               )
     if settings.DEBUG:
+        service = PRHandlerService(owner=owner,
+                                   repo=repo,
+                                   access_token=access_token,
+                                   pr_id=pr_id
+                                   )
         return service.run(action)
-    else:
-        p = Process(target=service.run, args=(action,))
-        p.start()
+
+    return get_worker_pool().submit(owner, repo, access_token, pr_id, action)
@@ -0,0 +1,219 @@
+#!-*- utf-8 -*-
+
+import fcntl
+import logging
+import os
+import threading
+
+import yaml
+
+from common.func import load_json, save_json, parse_yaml
+from common.git import GitObjectReader, rev_parse, list_tree, diff_tree
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+INDEX_VERSION = 1
+SIG_ORGS = ("openeuler", "src-openeuler")  # sig/<sig>/<org>/<x>/<repo>.yaml 中的组织
+
+
+def committer_repos(repositories: list) -> dict[str, list[str]]:
+    """
+    sig-info.yaml repositories 中每个 committer 负责的仓库
+    :param repositories: sig-info.yaml 的 repositories 部分
+    :return: key: committer id, value: 仓库列表
+    """
+    result = {}
+    for item in repositories or []:
+        repos, committers = item.get("repo", []) or [], item.get("committers", []) or []
+        for committer in committers:
+            result.setdefault(committer.get("gitee_id"), []).extend(repos)
+    return result
+
+
+def _sig_of(path: str) -> tuple[str, str] | None:
+    """
+    解析 sig 目录下的文件
+    :return: tuple(sig, 类型), 类型 info: sig-info.yaml, 其他为仓库名 <org>/<repo>; 与 sig 无关时返回 None
+    """
+    parts = path.split("/")
+    if len(parts) == 3 and parts[0] == "sig" and parts[2] == "sig-info.yaml":
+        return parts[1], "info"
+    if len(parts) == 5 and parts[0] == "sig" and parts[2] in SIG_ORGS and parts[4].endswith(".yaml"):
+        return parts[1], f"{parts[2]}/{parts[4][:-len('.yaml')]}"
+    return None
+
+
+class SigIndex:
+    """
+    openeuler/community 仓某个 master 提交的 sig 归属索引: sig -> maintainers, committer -> 仓库, 仓库 -> sig
+    """
+
+    def __init__(self, commit: str = "", sigs: dict = None):
+        self.commit = commit  # 索引对应的 master 提交
+        # key: sig, value: dict(maintainers: 列表, committers: committer -> 仓库列表,
+        #                       info_repos: sig-info.yaml 中的仓库, path_repos: sig 目录下仓库 yaml 对应的仓库)
+        self.sigs = sigs or {}
+        self._repo_sigs = None
+        self._committer_repos = None
+
+    def maintainers(self, sig: str) -> list[str]:
+        """
+        sig 的 maintainer id 列表
+        """
+        return list(self.sigs.get(sig, {}).get("maintainers", []))
+
+    def committers(self, sig: str) -> dict[str, list[str]]:
+        """
+        sig 中每个 committer 负责的仓库
+        """
+        return {k: list(v) for k, v in self.sigs.get(sig, {}).get("committers", {}).items()}
+
+    def repo_sig(self, repo: str) -> str | None:
+        """
+        仓库所属 sig
+        :param repo: <org>/<repo>
+        """
+        if self._repo_sigs is None:
+            self._repo_sigs = {}
+            for sig, data in self.sigs.items():
+                for x in data.get("path_repos", []) + data.get("info_repos", []):
+                    self._repo_sigs.setdefault(x, sig)
+        return self._repo_sigs.get(repo)
+
+    def committer_repos(self, committer: str) -> list[str]:
+        """
+        committer 在所有 sig 中负责的仓库
+        """
+        if self._committer_repos is None:
+            self._committer_repos = {}
+            for data in self.sigs.values():
+                for x, repos in data.get("committers", {}).items():
+                    self._committer_repos.setdefault(x, []).extend(repos)
+        return list(self._committer_repos.get(committer, []))
+
+    def _load_info(self, sig: str, content: bytes | None):
+        data = self.sigs.setdefault(sig, {"path_repos": []})
+        try:
+            info = (parse_yaml(content) or {}) if content else {}
+        except yaml.YAMLError as err:
+            logging.error(f"parse sig/{sig}/sig-info.yaml at {self.commit} failed: {err}")
+            info = {}
+
+        repositories = info.get("repositories", []) or []
+        data["maintainers"] = [x.get("gitee_id") for x in info.get("maintainers", []) or []]
+        data["committers"] = committer_repos(repositories)
+        data["info_repos"] = [x for item in repositories for x in item.get("repo", []) or []]
+
+    def _apply(self, reader: GitObjectReader, changes: list[tuple[str, str]]):
+        # partial clone 中一次获取所有需要解析的 sig-info.yaml
+        reader.prefetch(self.commit, [x[1] for x in changes if x[0] != "D" and x[1].endswith("/sig-info.yaml")])
+
+        for status, path in changes:
+            parsed = _sig_of(path)
+            if parsed is None:
+                continue
+
+            sig, kind = parsed
+            if kind == "info":
+                if status == "D":
+                    data = self.sigs.get(sig, {})
+                    for key in ("maintainers", "committers", "info_repos"):
+                        data.pop(key, None)
+                else:
+                    self._load_info(sig, reader.read(self.commit, path))
+            elif status == "D":
+                data = self.sigs.get(sig, {})
+                if kind in data.get("path_repos", []):
+                    data["path_repos"].remove(kind)
+            else:
+                data = self.sigs.setdefault(sig, {"path_repos": []})
+                if kind not in data["path_repos"]:
+                    data["path_repos"].append(kind)
+
+        # 删除已无任何内容的 sig
+        for sig in [k for k, v in self.sigs.items() if not v.get("path_repos") and "maintainers" not in v]:
+            del self.sigs[sig]
+        self._repo_sigs = self._committer_repos = None
+
+    @classmethod
+    def build(cls, reader: GitObjectReader, commit: str) -> "SigIndex | None":
+        """
+        全量构建索引
+        :param reader: master 所在仓库的对象读取器
+        :param commit: master 提交
+        """
+        paths = list_tree(reader.git_dir, commit, "sig")
+        if paths is None:
+            return None
+
+        index = cls(commit)
+        index._apply(reader, [("A", x) for x in paths])
+        return index
+
+    def update(self, reader: GitObjectReader, commit: str) -> bool:
+        """
+        根据两个 master 提交之间变化的文件增量更新索引
+        :param reader: master 所在仓库的对象读取器
+        :param commit: 新的 master 提交
+        :return: 旧提交不存在等无法增量更新时返回 False
+        """
+        changes = diff_tree(reader.git_dir, self.commit, commit, "sig")
+        if changes is None:
+            return False
+
+        self.commit = commit
+        self._apply(reader, changes)
+        return True
+
+    @classmethod
+    def load(cls, path: str) -> "SigIndex | None":
+        data = load_json(path)
+        if data.get("version") != INDEX_VERSION or not data.get("commit"):
+            return None
+        return cls(data["commit"], data.get("sigs", {}))
+
+    def save(self, path: str):
+        save_json(path, {"version": INDEX_VERSION, "commit": self.commit, "sigs": self.sigs})
+
+
+_cache = {}  # key: 索引文件路径, value: SigIndex
+_cache_lock = threading.Lock()
+
+
+def get_sig_index(reader: GitObjectReader, rev: str, path: str) -> SigIndex:
+    """
+    获取 rev 对应提交的 sig 索引: 进程内缓存 -> 磁盘索引增量更新 -> 全量构建
+    :param reader: 仓库对象读取器
+    :param rev: master 版本, eg: remotes/origin/master
+    :param path: 索引文件路径
+    :return: 索引, 获取失败时返回空索引
+    """
+    commit = rev_parse(reader.git_dir, rev)
+    if not commit:
+        logging.error(f"resolve {rev} in {reader.git_dir} failed")
+        return SigIndex()
+
+    cached = _cache.get(path)
+    if cached is not None and cached.commit == commit:
+        return cached
+
+    with _cache_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 多个 worker 进程通过文件锁串行更新同一个索引
+        with open(f"{path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            index = SigIndex.load(path)
+            stale = index is None or index.commit != commit
+            if index is not None and stale and not index.update(reader, commit):
+                index = None
+            if index is None:
+                logging.info(f"build sig index of {commit}")
+                index = SigIndex.build(reader, commit)
+                if index is None:
+                    return SigIndex()
+            if stale:
+                index.save(path)
+
+        _cache[path] = index
+        return index
@@ -1,8 +1,14 @@
 from django.urls import path
-from business.views import HealthCheckView, CommunityPRCIView
+from common.decorator import admin_check_decorator, permission_check_decorator
+from business.views import HealthCheckView, MetricsView, JobListView, JobDetailView, CommunityPRCIView
 
 
 urlpatterns = [
     path('health', HealthCheckView.as_view()),
-    path('review/', CommunityPRCIView.as_view()),
+    path('metrics', MetricsView.as_view()),
+    # 任务记录包含 PR 信息与失败原因, 只对持有 webhook 密钥的调用方或本机开放
+    path('jobs', admin_check_decorator(JobListView.as_view())),
+    path('jobs/<int:job_id>', admin_check_decorator(JobDetailView.as_view())),
+    # 异步视图, 在 as_view 外层校验请求; method_decorator 会把 async 方法包装成同步方法
+    path('review/', permission_check_decorator(CommunityPRCIView.as_view())),
 ]
@@ -5,12 +5,12 @@ import logging
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.generic import View
-from django.utils.decorators import method_decorator
 
-from common.decorator import permission_check_decorator
-from common.base_response import BadRequestResponse, OkResponse
+from common.base_response import BadRequestResponse, NotFoundResponse, OkResponse, ServiceUnavailableResponse
+from common.metrics import REGISTRY
 
-from business.service import call
+from business.ingress import get_ingress
+from business.job_store import list_jobs, get_job
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
 
@@ -24,13 +24,55 @@ class HealthCheckView(View):
         return HttpResponse(status=200, content="health check...")
 
 
-@method_decorator(permission_check_decorator, name="post")
+class MetricsView(View):
+    """
+    Prometheus 指标
+    """
+
+    def get(self, *args, **kwargs):
+        return HttpResponse(status=200, content=REGISTRY.render(), content_type="text/plain; version=0.0.4")
+
+
+class JobListView(View):
+    """
+    任务列表, 按创建时间倒序, 支持按 state/owner/repo/pr_id 过滤, limit 最大 1000
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(int(request.GET.get("limit", 100)), 1000)
+        except ValueError:
+            return BadRequestResponse(msg="Invalid limit")
+
+        data = list_jobs(state=request.GET.get("state"),
+                         owner=request.GET.get("owner"),
+                         repo=request.GET.get("repo"),
+                         pr_id=request.GET.get("pr_id"),
+                         limit=limit
+                         )
+        return OkResponse(data=data)
+
+
+class JobDetailView(View):
+    """
+    单个任务详情
+    """
+
+    def get(self, request, job_id: int, *args, **kwargs):
+        job = get_job(job_id)
+        if job is None:
+            return NotFoundResponse()
+        return OkResponse(data=job)
+
+
 class CommunityPRCIView(View):
     """
-    community仓门禁检查
+    community仓门禁检查, 异步视图: 校验后提交任务, 任务记录写入后立即返回, 不等待检查执行
+    无法接收任务时返回 503, 由 Gitcode 重新投递
+    请求校验由 permission_check_decorator 完成, 见 business/urls.py
     """
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         pr_url: str = request.JSON.get("merge_request", {}).get("url")
 
         logging.info(f"PR link: {pr_url}")
@@ -38,12 +80,16 @@ class CommunityPRCIView(View):
         if not pr_url or request.InvalidRequest:
             return BadRequestResponse()
 
-        owner, repo, _, pr_id = pr_url.replace("https://gitcode.com/", "").split("/")
+        parts = pr_url.replace("https://gitcode.com/", "").split("/")
+        if len(parts) != 4:
+            return BadRequestResponse(msg="Invalid PR link")
+        owner, repo, _, pr_id = parts
+        accepted = True
         if request.IsPRCreatOROpenEvent:  # PR创建或者打开事件
-            call(owner, repo, settings.ACCESS_TOKEN, pr_id, "create")
+            accepted = await get_ingress().submit(owner, repo, settings.ACCESS_TOKEN, pr_id, "create")
 
         elif request.IsPRUpdateEvent:  # PR更新事件
-            pass
+            accepted = await get_ingress().submit(owner, repo, settings.ACCESS_TOKEN, pr_id, "edit")
 
         elif request.IsCommentEvent:  # 评论事件
             pass
@@ -51,4 +97,6 @@ class CommunityPRCIView(View):
         else:
             return BadRequestResponse(msg="Invalid Event")
 
+        if not accepted:
+            return ServiceUnavailableResponse()
         return OkResponse()
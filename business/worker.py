@@ -0,0 +1,313 @@
+#!-*- utf-8 -*-
+
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import wait
+
+from django.conf import settings
+
+from business import job_store
+from business.models import ReviewJob
+from business.worker_process import worker_main
+from common.metrics import REGISTRY, QUEUE_WAIT_SECONDS, JOBS_TOTAL, QUEUE_DEPTH, BUSY_WORKERS
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+# 合并同一 PR 的多个事件时, 优先级高的动作覆盖优先级低的动作
+ACTION_PRIORITY = {"edit": 0, "create": 1}
+
+
+class Job:
+    """
+    一次 PR 检查任务
+    """
+
+    def __init__(self,
+                 job_id: int,
+                 owner: str,
+                 repo: str,
+                 access_token: str,
+                 pr_id: int,
+                 action: str,
+                 delay: float = 0,
+                 record_id: int = None
+                 ):
+        self.job_id = job_id
+        self.record_id = record_id  # 任务记录 id, business.models.ReviewJob
+        self.owner = owner
+        self.repo = repo
+        self.token = access_token
+        self.pr_id = pr_id
+        self.action = action
+
+        self.enqueued_at = time.time()  # 入队时间
+        self.ready_at = self.enqueued_at + delay  # 最早执行时间, 在此之前到达的同一 PR 事件合并到本任务
+        self.started_at = None  # 开始执行时间
+        self.events = 1  # 合并的事件数
+
+    @property
+    def key(self) -> tuple:
+        return self.owner, self.repo, str(self.pr_id)
+
+    def merge(self, action: str):
+        """
+        合并同一 PR 的新事件
+        :param action: 新事件的动作
+        """
+        if ACTION_PRIORITY.get(action, 0) > ACTION_PRIORITY.get(self.action, 0):
+            self.action = action
+        self.events += 1
+
+    def __str__(self):
+        return f"job {self.job_id}({self.owner}/{self.repo}/{self.pr_id} {self.action})"
+
+
+class WorkerPool:
+    """
+    固定数量的常驻 worker 进程, 由调度线程从队列中取任务分发, 并处理超时
+    同一 PR 在队列中最多只有一个任务, 新事件合并到排队中的任务; 同一 PR 同时最多只有一个任务在执行
+    """
+
+    def __init__(self, size: int, timeout: int, queue_size: int, debounce: float = 0, max_attempts: int = 3,
+                 heartbeat: float = 30, stale_after: float = 120, retention: float = 7 * 86400):
+        self.size = size  # worker 进程数, 即最大并发数
+        self.timeout = timeout  # 单个任务超时时间, 秒
+        self.queue_size = queue_size  # 等待队列最大长度
+        self.debounce = debounce  # 事件合并窗口, 秒
+        self.max_attempts = max_attempts  # 恢复的任务最多执行次数
+        self.heartbeat = heartbeat  # 刷新任务记录与恢复无人负责任务的间隔, 秒
+        self.stale_after = stale_after  # 未完成任务的记录超过多少秒未刷新视为无人负责, 秒
+        self.retention = retention  # 已结束任务记录的保留时间, 秒
+        self._last_heartbeat = 0.0
+
+        # 调度、请求等线程运行期间创建 worker, fork 可能继承其他线程持有的锁, 使用 spawn 启动全新的解释器
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue = OrderedDict()  # 等待执行的任务, key: Job.key
+        self._workers = {}  # key: worker id, value: [进程, 管道, 正在执行的任务]
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = self._ctx.Pipe(duplex=False)
+        self._ids = itertools.count(1)
+        self._thread = None
+
+    def start(self):
+        """
+        启动 worker 进程与调度线程
+        """
+        for worker_id in range(self.size):
+            self._spawn(worker_id)
+
+        # 恢复服务重启前未完成的任务
+        with self._lock:
+            self._maintain(time.time())
+
+        self._thread = threading.Thread(target=self._loop, name="worker-pool", daemon=True)
+        self._thread.start()
+
+    def submit(self,
+               owner: str,
+               repo: str,
+               access_token: str,
+               pr_id: int,
+               action: str,
+               record_id: int = None
+               ) -> bool:
+        """
+        提交任务到等待队列
+        :param record_id: 恢复的任务记录 id, 为空时新建任务记录
+        :return: 队列已满时返回 False
+        """
+        with self._lock:
+            return self._submit(owner, repo, access_token, pr_id, action, record_id)
+
+    def _submit(self, owner: str, repo: str, access_token: str, pr_id: int, action: str, record_id: int = None) -> bool:
+        job = self._queue.get((owner, repo, str(pr_id)))
+        if job is not None:
+            # 同一 PR 已有排队中的任务, 合并事件, 不再新增任务
+            job.merge(action)
+            JOBS_TOTAL.inc(result="coalesced")
+            logging.info(f"{job} coalesced {action} event, events: {job.events}")
+            job_store.merge_job(job.record_id, job.action, job.events)
+            if record_id is not None:
+                job_store.finish_job(record_id, ReviewJob.STATE_MERGED, error=f"merged into job {job.record_id}")
+            return True
+
+        if len(self._queue) >= self.queue_size:
+            logging.error(f"job queue is full({self.queue_size}), drop {owner}/{repo}/{pr_id} {action}")
+            JOBS_TOTAL.inc(result="dropped")
+            return False
+
+        if record_id is None:
+            record_id = job_store.create_job(owner, repo, pr_id, action)
+            if record_id is None:
+                # 未持久化的任务在服务重启后会丢失, 拒绝接收, 由 webhook 重新投递
+                JOBS_TOTAL.inc(result="dropped")
+                return False
+        job = Job(next(self._ids), owner, repo, access_token, pr_id, action, self.debounce, record_id)
+        self._queue[job.key] = job
+        logging.info(f"{job} queued, queue depth: {len(self._queue)}")
+        self._wakeup_w.send_bytes(b"1")
+        return True
+
+    def _spawn(self, worker_id: int):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(target=worker_main,
+                                    args=(child_conn,),
+                                    name=f"worker-{worker_id}",
+                                    daemon=True
+                                    )
+        process.start()
+        child_conn.close()
+        self._workers[worker_id] = [process, parent_conn, None]
+
+    def _restart(self, worker_id: int):
+        process, conn, _ = self._workers[worker_id]
+        process.kill()
+        process.join(timeout=5)
+        conn.close()
+        self._spawn(worker_id)
+
+    def _next_job(self, now: float) -> Job | None:
+        """
+        取出下一个可执行的任务: 已过合并窗口, 且同一 PR 没有正在执行的任务
+        """
+        running = {x[2].key for x in self._workers.values() if x[2] is not None}
+        for key, job in self._queue.items():
+            if job.ready_at <= now and key not in running:
+                return self._queue.pop(key)
+        return None
+
+    def _dispatch(self):
+        """
+        将等待队列中的任务分发给空闲 worker
+        """
+        now = time.time()
+        for worker_id, worker in self._workers.items():
+            if worker[2] is not None:
+                continue
+
+            job = self._next_job(now)
+            if job is None:
+                return
+
+            try:
+                worker[1].send(job)
+            except OSError as err:
+                logging.error(f"send {job} to worker {worker_id} failed: {err}, restart worker")
+                self._queue[job.key] = job
+                self._queue.move_to_end(job.key, last=False)
+                self._restart(worker_id)
+                continue
+
+            job.started_at = time.time()
+            wait_time = job.started_at - job.enqueued_at
+            QUEUE_WAIT_SECONDS.observe(wait_time)
+
+            worker[2] = job
+            job_store.start_job(job.record_id)
+            logging.info(f"{job} started on worker {worker_id}, waited {wait_time:.2f}s, "
+                         f"queue depth: {len(self._queue)}")
+
+    def _finish(self, worker_id: int, success: bool, report: dict):
+        job = self._workers[worker_id][2]
+        self._workers[worker_id][2] = None
+        JOBS_TOTAL.inc(result="completed" if success else "failed")
+        job_store.finish_job(job.record_id, ReviewJob.STATE_SUCCEEDED if success else ReviewJob.STATE_FAILED,
+                             report.get("stages"), report.get("error", ""))
+        logging.info(f"{job} finished, success: {success}, cost {time.time() - job.started_at:.2f}s")
+
+    def _maintain(self, now: float):
+        """
+        刷新本进程负责的未完成任务记录, 恢复其他服务进程遗留的任务, 清理过期的任务记录
+        """
+        self._last_heartbeat = now
+        record_ids = [x.record_id for x in self._queue.values()]
+        record_ids += [x[2].record_id for x in self._workers.values() if x[2] is not None]
+        job_store.touch_jobs([x for x in record_ids if x is not None])
+
+        for record in job_store.claim_stale_jobs(self.stale_after, self.max_attempts):
+            logging.info(f"recover job record {record.id}({record.owner}/{record.repo}/{record.pr_id} "
+                         f"{record.action}), state: {record.state}, attempts: {record.attempts}")
+            if not self._submit(record.owner, record.repo, settings.ACCESS_TOKEN, record.pr_id, record.action,
+                                record.id):
+                job_store.finish_job(record.id, ReviewJob.STATE_FAILED, error="job queue is full")
+
+        job_store.purge_jobs(self.retention)
+
+    def _loop(self):
+        """
+        调度线程: 收集任务结果, 处理超时与异常退出的 worker, 分发新任务
+        """
+        while True:
+            conns = {x[1]: worker_id for worker_id, x in self._workers.items()}
+            with self._lock:
+                # 有任务在合并窗口中时, 等到窗口结束再分发; 已就绪的任务在 worker 空闲时会被唤醒分发
+                now = time.time()
+                timeout = min([1.0] + [x.ready_at - now for x in self._queue.values() if x.ready_at > now])
+            ready = wait(list(conns) + [self._wakeup_r], timeout=timeout)
+
+            with self._lock:
+                for conn in ready:
+                    if conn is self._wakeup_r:
+                        while self._wakeup_r.poll():
+                            self._wakeup_r.recv_bytes()
+                        continue
+
+                    worker_id = conns[conn]
+                    try:
+                        _, success, delta, report = conn.recv()
+                    except (EOFError, OSError):
+                        # worker 异常退出
+                        job = self._workers[worker_id][2]
+                        logging.error(f"worker {worker_id} exited unexpectedly, running: {job}")
+                        if job is not None:
+                            JOBS_TOTAL.inc(result="crashed")
+                            job_store.finish_job(job.record_id, ReviewJob.STATE_CRASHED,
+                                                 error="worker exited unexpectedly")
+                        self._restart(worker_id)
+                        continue
+                    REGISTRY.merge(delta)
+                    self._finish(worker_id, success, report)
+
+                now = time.time()
+                for worker_id, (_, _, job) in list(self._workers.items()):
+                    if job is not None and now - job.started_at > self.timeout:
+                        logging.error(f"{job} timeout after {self.timeout}s, restart worker {worker_id}")
+                        JOBS_TOTAL.inc(result="timed_out")
+                        job_store.finish_job(job.record_id, ReviewJob.STATE_TIMED_OUT,
+                                             error=f"timeout after {self.timeout}s")
+                        self._restart(worker_id)
+
+                if now - self._last_heartbeat >= self.heartbeat:
+                    self._maintain(now)
+
+                self._dispatch()
+                QUEUE_DEPTH.set(len(self._queue))
+                BUSY_WORKERS.set(sum(1 for x in self._workers.values() if x[2] is not None))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """
+    获取进程内唯一的 worker 池, 首次调用时按配置启动
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(size=settings.WORKER_POOL_SIZE,
+                               timeout=settings.JOB_TIMEOUT,
+                               queue_size=settings.JOB_QUEUE_SIZE,
+                               debounce=settings.JOB_DEBOUNCE_WINDOW,
+                               max_attempts=settings.JOB_MAX_ATTEMPTS,
+                               heartbeat=settings.JOB_HEARTBEAT_INTERVAL,
+                               stale_after=settings.JOB_STALE_AFTER,
+                               retention=settings.JOB_RETENTION
+                               )
+            _pool.start()
+    return _pool
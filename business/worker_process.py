@@ -0,0 +1,50 @@
+#!-*- utf-8 -*-
+
+import logging
+import os
+
+import django
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+
+def worker_main(conn):
+    """
+    worker 进程入口: 以 spawn 方式启动的全新解释器, 先初始化 Django, 再从管道接收任务, 执行完成后回报结果
+    本模块不在导入时依赖 Django, 子进程反序列化入口函数时不会提前加载 models
+    :param conn: 与调度线程通信的管道
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "robot_universal_ci_tools.settings")
+    django.setup()
+
+    from business.service import PRHandlerService
+    from business.workspace import get_workspace_manager
+    from common.metrics import REGISTRY
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if job is None:
+            break
+
+        success, report = False, {"stages": {}, "error": ""}
+        # 文件锁保证多个服务进程之间同一 PR 也只有一个任务在执行
+        with get_workspace_manager().pr_lock(job.owner, job.repo, job.pr_id):
+            service = None
+            try:
+                service = PRHandlerService(owner=job.owner,
+                                           repo=job.repo,
+                                           access_token=job.token,
+                                           pr_id=job.pr_id
+                                           )
+                success = bool(service.run(job.action))
+            except Exception as err:
+                logging.exception(f"{job} failed: {err}")
+                report["error"] = f"{type(err).__name__}: {err}"
+            if service is not None:
+                report["stages"] = dict(service.timer.stages)
+
+        conn.send((job.job_id, success, REGISTRY.drain(), report))
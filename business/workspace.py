@@ -0,0 +1,307 @@
+#!-*- utf-8 -*-
+
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from common.metrics import WORKSPACE_BYTES, WORKSPACE_EVICTED_TOTAL
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+# data/ 下由服务管理的目录, 其余目录为旧版本遗留的工作区(如 data/{owner}_{repo}_{pr_id}), 回收时删除
+KNOWN_DIRS = ("mirrors", "state", "index", "locks")
+# 临时文件与旧工作区超过该时间未修改才视为遗留, 避免删除正在写入的文件, 秒
+ORPHAN_AGE = 3600
+# 超过配额后淘汰到配额的比例, 避免每次回收都只淘汰一个镜像
+LOW_WATERMARK = 0.9
+
+
+@contextmanager
+def locked_file(path: str, operation: int):
+    """
+    打开并锁定锁文件, 锁定后确认路径仍指向该文件, 否则重新打开; 回收时可以删除未被锁定的锁文件
+    :param path: 锁文件路径
+    :param operation: fcntl.LOCK_SH / fcntl.LOCK_EX, 可加 fcntl.LOCK_NB, 无法锁定时抛出 BlockingIOError
+    :return: 锁文件
+    """
+    while True:
+        with open(path, "a") as lock:
+            fcntl.flock(lock, operation)
+            try:
+                current = os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                yield lock
+                return
+
+
+def disk_usage(path: str) -> int:
+    """
+    目录实际占用的磁盘空间, 与 du 一致
+    """
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += disk_usage(entry.path)
+            else:
+                total += entry.stat(follow_symlinks=False).st_blocks * 512
+        except OSError:
+            continue
+    return total
+
+
+class WorkspaceManager:
+    """
+    data/ 目录管理: 分配仓库镜像目录, 按磁盘配额淘汰最久未使用的镜像, 回收遗留文件
+    任务执行期间持有镜像的共享锁, 正在使用的镜像不会被淘汰
+    """
+
+    def __init__(self, root: str, quota: int, min_free: int, interval: float, state_ttl: float):
+        self.root = root  # data 目录
+        self.quota = quota  # data 目录最大占用空间, 字节
+        self.min_free = min_free  # 磁盘最少剩余空间, 字节
+        self.interval = interval  # 定期回收间隔, 秒
+        self.state_ttl = state_ttl  # PR 评估状态超过该时间未更新则删除, 秒
+        self._thread = None
+
+    def mirror_dir(self, owner: str, repo: str, mode: str = "full") -> str:
+        """
+        仓库镜像目录, 同一仓库的所有 PR 共用
+        :param mode: 代码镜像模式, blobless 模式为 partial clone, 与完整镜像分开存放
+        """
+        suffix = ".blobless.git" if mode == "blobless" else ".git"
+        return f"{self.root}/mirrors/{owner}/{repo}{suffix}"
+
+    def state_path(self, owner: str, repo: str, pr_id) -> str:
+        """
+        PR 上次评估状态文件
+        """
+        return f"{self.root}/state/{owner}_{repo}_{pr_id}.json"
+
+    def index_path(self, owner: str, repo: str) -> str:
+        """
+        master 分支 sig 索引文件
+        """
+        return f"{self.root}/index/{owner}_{repo}.json"
+
+    @contextmanager
+    def pr_lock(self, owner: str, repo: str, pr_id):
+        """
+        PR 文件锁, 保证多个服务进程、worker 进程与线程之间同一 PR 同时只有一个任务在执行
+        """
+        os.makedirs(f"{self.root}/locks", exist_ok=True)
+        with locked_file(f"{self.root}/locks/{owner}_{repo}_{pr_id}.lock", fcntl.LOCK_EX) as lock:
+            # 最近使用时间, 长时间未使用的锁文件会被回收
+            os.utime(lock.fileno())
+            yield
+
+    @contextmanager
+    def use(self, mirror_dir: str):
+        """
+        任务执行期间使用镜像: 持有共享锁并刷新最近使用时间
+        """
+        os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+        with locked_file(f"{mirror_dir}.use", fcntl.LOCK_SH) as lock:
+            os.utime(lock.fileno())
+            yield
+
+    def start(self):
+        """
+        回收一次, 并启动定期回收线程
+        """
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.collect()
+                except Exception as err:
+                    logging.exception(f"collect workspaces failed: {err}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=run, name="workspace-gc", daemon=True)
+        self._thread.start()
+
+    def collect(self) -> dict:
+        """
+        回收遗留文件, 超过配额或磁盘剩余空间不足时淘汰最久未使用的镜像
+        :return: 回收结果
+        """
+        start = time.perf_counter()
+        now = time.time()
+        removed = self._remove_orphans(now)
+
+        mirrors = self._mirrors(sizes=True)
+        total = disk_usage(self.root)
+        free = shutil.disk_usage(self.root).free if os.path.isdir(self.root) else self.min_free
+        need = max(total - int(self.quota * LOW_WATERMARK) if total > self.quota else 0,
+                   self.min_free - free)
+
+        evicted, freed = 0, 0
+        for _, path, size in sorted(mirrors):
+            if need <= freed:
+                break
+            if self._evict(path):
+                evicted += 1
+                freed += size
+
+        WORKSPACE_BYTES.set(total - freed)
+        logging.info(f"collect workspaces: {total} bytes in use, {len(mirrors)} mirrors, remove {removed} orphans, "
+                     f"evict {evicted} mirrors({freed} bytes), cost {time.perf_counter() - start:.2f}s")
+        return {"bytes": total - freed, "mirrors": len(mirrors), "orphans": removed, "evicted": evicted}
+
+    def _mirrors(self, sizes: bool = False) -> list[tuple[float, str, int]]:
+        """
+        所有镜像
+        :param sizes: 是否统计占用空间
+        :return: list[tuple(最近使用时间, 路径, 占用空间)]
+        """
+        result = []
+        base = f"{self.root}/mirrors"
+        for owner in os.listdir(base) if os.path.isdir(base) else []:
+            owner_dir = f"{base}/{owner}"
+            if not os.path.isdir(owner_dir):
+                continue
+            for name in os.listdir(owner_dir):
+                path = f"{owner_dir}/{name}"
+                if not name.endswith(".git") or not os.path.isdir(path):
+                    continue
+                try:
+                    used = os.stat(f"{path}.use").st_mtime
+                except OSError:
+                    used = os.stat(path).st_mtime
+                result.append((used, path, disk_usage(path) if sizes else 0))
+        return result
+
+    @staticmethod
+    def _remove_mirror(path: str) -> bool:
+        """
+        删除没有任务在使用的镜像, 以及镜像的锁文件
+        持有 .use 排他锁时没有任务在准备或使用镜像, 等待中的任务锁定后发现锁文件已删除会重新打开
+        :return: 是否删除
+        """
+        try:
+            with locked_file(f"{path}.use", fcntl.LOCK_EX | fcntl.LOCK_NB):
+                shutil.rmtree(path, ignore_errors=True)
+                for lock_file in (f"{path}.lock", f"{path}.use"):
+                    try:
+                        os.remove(lock_file)
+                    except FileNotFoundError:
+                        pass
+        except BlockingIOError:
+            return False
+        return True
+
+    def _evict(self, path: str, reason: str = "quota") -> bool:
+        """
+        淘汰没有任务在使用的镜像
+        :return: 是否删除
+        """
+        if not self._remove_mirror(path):
+            return False
+
+        WORKSPACE_EVICTED_TOTAL.inc(reason=reason)
+        logging.info(f"evict mirror {path}, reason: {reason}")
+        return True
+
+    @staticmethod
+    def _remove_lock(path: str, now: float) -> bool:
+        """
+        删除超过 ORPHAN_AGE 未使用且未被锁定的 PR 锁文件
+        :return: 是否删除
+        """
+        try:
+            with locked_file(path, fcntl.LOCK_EX | fcntl.LOCK_NB) as lock:
+                if now - os.fstat(lock.fileno()).st_mtime <= ORPHAN_AGE:
+                    return False
+                os.remove(path)
+        except (BlockingIOError, FileNotFoundError):
+            return False
+        return True
+
+    def _remove_orphans(self, now: float) -> int:
+        """
+        删除遗留文件: 未完成的 clone、镜像已删除的锁文件、长时间未使用的 PR 锁文件、中断写入的临时文件、
+        过期的 PR 评估状态、旧版本的 PR 工作区
+        :return: 删除的文件与目录数
+        """
+        removed = 0
+        for used, path, _ in self._mirrors():
+            # clone 中断时镜像目录不完整, prepare_env.sh 不会重新 clone
+            if not os.path.exists(f"{path}/HEAD") and now - used > ORPHAN_AGE and self._evict(path, "incomplete"):
+                removed += 1
+
+        # 镜像目录已不存在的锁文件, 如旧版本淘汰镜像后遗留的
+        base = f"{self.root}/mirrors"
+        for owner in os.listdir(base) if os.path.isdir(base) else []:
+            owner_dir = f"{base}/{owner}"
+            for entry in os.scandir(owner_dir) if os.path.isdir(owner_dir) else []:
+                mirror, ext = os.path.splitext(entry.path)
+                if ext not in (".lock", ".use") or not mirror.endswith(".git") or os.path.exists(mirror):
+                    continue
+                try:
+                    # .lock 与 .use 一起删除, 第二个文件可能已不存在
+                    if now - entry.stat().st_mtime > ORPHAN_AGE and self._remove_mirror(mirror):
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        locks = f"{self.root}/locks"
+        for entry in os.scandir(locks) if os.path.isdir(locks) else []:
+            if entry.name.endswith(".lock") and self._remove_lock(entry.path, now):
+                removed += 1
+
+        for name in ("state", "index"):
+            base = f"{self.root}/{name}"
+            for entry in os.scandir(base) if os.path.isdir(base) else []:
+                try:
+                    age = now - entry.stat().st_mtime
+                    if (entry.name.endswith(".tmp") and age > ORPHAN_AGE) \
+                            or (name == "state" and entry.name.endswith(".json") and age > self.state_ttl):
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    continue
+
+        for entry in os.scandir(self.root) if os.path.isdir(self.root) else []:
+            if entry.is_dir(follow_symlinks=False) and entry.name not in KNOWN_DIRS \
+                    and now - entry.stat().st_mtime > ORPHAN_AGE:
+                logging.info(f"remove legacy workspace {entry.path}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+
+        return removed
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """
+    获取进程内唯一的 data 目录管理器
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager(root=f"{settings.BASE_DIR}/data",
+                                        quota=settings.WORKSPACE_QUOTA,
+                                        min_free=settings.WORKSPACE_MIN_FREE,
+                                        interval=settings.WORKSPACE_GC_INTERVAL,
+                                        state_ttl=settings.WORKSPACE_STATE_TTL
+                                        )
+    return _manager
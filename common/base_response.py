@@ -8,6 +8,24 @@ class BadRequestResponse(JsonResponse):
         JsonResponse.__init__(self, status=400, data={"code": code, "msg": msg})
 
 
+class ForbiddenResponse(JsonResponse):
+    def __init__(self, code: int = 403, msg: str = "Forbidden"):
+        JsonResponse.__init__(self, status=403, data={"code": code, "msg": msg})
+
+
+class NotFoundResponse(JsonResponse):
+    def __init__(self, code: int = 404, msg: str = "Not Found"):
+        JsonResponse.__init__(self, status=404, data={"code": code, "msg": msg})
+
+
+class ServiceUnavailableResponse(JsonResponse):
+    def __init__(self, code: int = 503, msg: str = "Service Unavailable"):
+        JsonResponse.__init__(self, status=503, data={"code": code, "msg": msg})
+
+
 class OkResponse(JsonResponse):
-    def __init__(self, code: int = 200, msg: str = "ok"):
-        JsonResponse.__init__(self, status=200, data={"code": code, "msg": msg})
+    def __init__(self, code: int = 200, msg: str = "ok", data=None):
+        body = {"code": code, "msg": msg}
+        if data is not None:
+            body["data"] = data
+        JsonResponse.__init__(self, status=200, data=body)
@@ -55,5 +55,36 @@ Category_EN = {
 FAILURE_COMMENT = 'Failed to create review list.You can try to rebuild using "/review retrigger".:confused:'
 PR_CONFLICT_COMMENT = "Conflict exists in PR.Please resolve conflict before review.@{owner}"
 
+# Gitcode API 地址与代码仓地址
+GITCODE_API_URL = "https://api.gitcode.com/api/v5"
+GIT_BASE_URL = "https://gitcode.com"
+
 SIGCommunity = ["openeuler", "src-openeuler"]
 WaitConFirmLabel = "wait_confirm"
+
+# Gitcode API 客户端配置: 连接池大小, (连接超时, 读取超时), 幂等请求最大重试次数, 重试退避基数(秒)
+GITCODE_POOL_SIZE = 10
+GITCODE_TIMEOUT = (5, 30)
+GITCODE_RETRIES = 3
+GITCODE_BACKOFF = 0.5
+
+# Gitcode API 限流配置: 每进程每秒请求数上限, 突发请求数, 被限流(429)后最大重试次数
+# 响应中带有限流头时, 按剩余配额与重置时间自动降低速率
+GITCODE_RATE = 10
+GITCODE_BURST = 20
+GITCODE_RATE_LIMIT_RETRIES = 5
+
+# webhook 请求头: 事件类型, 请求体的 HMAC-SHA256 签名, 或与密钥一致的 token
+# 事件头存在且不是以下事件时, 不读取请求体直接拒绝
+WEBHOOK_EVENT_HEADER = "X-GitCode-Event"
+WEBHOOK_EVENTS = ("Merge Request Hook", "Note Hook")
+WEBHOOK_SIGNATURE_HEADER = "X-GitCode-Signature-256"
+WEBHOOK_TOKEN_HEADER = "X-GitCode-Token"
+
+# yaml 解析结果缓存: 最大条目数, 缓存内容的原始字节数上限
+YAML_CACHE_ENTRIES = 4096
+YAML_CACHE_BYTES = 64 * 1024 * 1024
+
+# 流式执行命令的默认限制: 超时时间(秒), 标准输出最大字节数, 超过后终止命令
+EXEC_TIMEOUT = 300
+EXEC_MAX_BYTES = 256 * 1024 * 1024
@@ -1,35 +1,152 @@
 #!-*- utf-8 -*-
 
+import asyncio
+import hashlib
+import hmac
 import json
 import logging
 
+from django.conf import settings
 from django.http import JsonResponse
-from common.base_response import BadRequestResponse
+from common.base_response import BadRequestResponse, ForbiddenResponse
+from common.config import WEBHOOK_EVENT_HEADER, WEBHOOK_EVENTS, WEBHOOK_SIGNATURE_HEADER, WEBHOOK_TOKEN_HEADER
+from common.metrics import WEBHOOK_REJECTED_TOTAL
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
 
 EventTypeSet = ["merge_request", "note"]
 ActionSet = ["open", "reopen", "update"]
+LOCAL_ADDRS = ("127.0.0.1", "::1")
 
 
-def permission_check_decorator(func):
+def _header(request, name: str) -> str:
+    return request.META.get("HTTP_" + name.upper().replace("-", "_"), "")
+
+
+def verify_signature(request, body: bytes, secret: str) -> bool:
+    """
+    校验 webhook 签名, 使用常量时间比较
+    支持两种方式: 签名头为请求体的 HMAC-SHA256(可带 "sha256=" 前缀), 或 token 头与密钥一致
+    :param body: 请求体
+    :param secret: webhook 密钥
+    :return:
+    """
+    signature = _header(request, WEBHOOK_SIGNATURE_HEADER)
+    if signature:
+        expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature.removeprefix("sha256=").encode("utf-8"), expected.encode("utf-8"))
+
+    token = _header(request, WEBHOOK_TOKEN_HEADER)
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), secret.encode("utf-8"))
+
+
+def verify_admin(request, secret: str) -> bool:
+    """
+    校验内部接口请求: 配置了 webhook 密钥时, token 头或 Authorization: Bearer 必须与密钥一致;
+    未配置密钥时只允许本机访问
+    :param secret: webhook 密钥
+    :return:
+    """
+    if not secret:
+        return request.META.get("REMOTE_ADDR") in LOCAL_ADDRS
+
+    token = _header(request, WEBHOOK_TOKEN_HEADER) or _header(request, "Authorization").removeprefix("Bearer ")
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), secret.encode("utf-8"))
+
+
+def admin_check_decorator(func):
     """
-    检查请求是否是符合规则
+    内部接口(如任务查询)的访问校验, 校验规则见 verify_admin
     """
 
     def wrapper(request, *args, **kwargs):
+        if not verify_admin(request, settings.WEBHOOK_SECRET):
+            logging.info(f"reject {request.path} from {request.META.get('REMOTE_ADDR')}")
+            return ForbiddenResponse()
+        return func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def parse_event(body: bytes) -> dict | None:
+    """
+    解析 webhook 请求体, 只保留需要的字段: event_type, merge_request.action, merge_request.url
+    :return: 格式错误或字段不是字符串时返回 None
+    """
+    # 不含 event_type 的请求体不可能是合法事件, 不做 json 解析
+    if b'"event_type"' not in body:
+        return None
 
-        data = json.loads(request.body)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    merge_request = data.get("merge_request")
+    if not isinstance(merge_request, dict):
+        return None
+
+    event_type, action, url = data.get("event_type"), merge_request.get("action"), merge_request.get("url")
+    # 字段类型不对时视图无法处理, 按格式错误拒绝
+    if not all(isinstance(x, str) for x in (event_type, action, url)):
+        return None
+
+    return {
+        "event_type": event_type,
+        "merge_request": {"action": action, "url": url},
+    }
+
+
+def _reject(reason: str, response: JsonResponse) -> JsonResponse:
+    WEBHOOK_REJECTED_TOTAL.inc(reason=reason)
+    logging.info(f"reject webhook: {reason}")
+    return response
+
+
+def permission_check_decorator(func):
+    """
+    检查请求是否是符合规则, 同时支持同步与异步视图
+    按开销从低到高依次检查: 请求体大小、事件头、签名, 最后才解析请求体
+    """
+
+    def check(request):
+        """
+        :return: 不符合规则时返回错误响应, 否则返回 None
+        """
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return _reject("content_length", BadRequestResponse())
+        if length > settings.WEBHOOK_MAX_BODY_SIZE:
+            return _reject("too_large", BadRequestResponse(msg="Payload Too Large"))
+
+        event = _header(request, WEBHOOK_EVENT_HEADER)
+        if event and event not in WEBHOOK_EVENTS:
+            return _reject("event_header", BadRequestResponse(msg="Invalid Event"))
+
+        body = request.body
+        if len(body) > settings.WEBHOOK_MAX_BODY_SIZE:
+            return _reject("too_large", BadRequestResponse(msg="Payload Too Large"))
+
+        if settings.WEBHOOK_SECRET and not verify_signature(request, body, settings.WEBHOOK_SECRET):
+            return _reject("signature", ForbiddenResponse())
+
+        data = parse_event(body)
+        if data is None:
+            return _reject("malformed", BadRequestResponse())
 
         event_type, action = data.get("event_type"), data.get("merge_request", {}).get("action")
 
         logging.info(f"Event_type: {event_type}, action: {action}")
 
         if not event_type or not action:
-            return BadRequestResponse()
+            return _reject("event", BadRequestResponse())
 
         if event_type not in EventTypeSet or action not in ActionSet:
-            return BadRequestResponse()
+            return _reject("event", BadRequestResponse())
 
         request.JSON = data
 
@@ -42,6 +159,21 @@ def permission_check_decorator(func):
         # 评论事件
         request.IsCommentEvent = True if (event_type == "note" and action == "open") else False
 
+        return None
+
+    if asyncio.iscoroutinefunction(func):
+        async def async_wrapper(request, *args, **kwargs):
+            response = check(request)
+            if response is not None:
+                return response
+            return await func(request, *args, **kwargs)
+
+        return async_wrapper
+
+    def wrapper(request, *args, **kwargs):
+        response = check(request)
+        if response is not None:
+            return response
         return func(request, *args, **kwargs)
 
     return wrapper
@@ -1,12 +1,27 @@
 #!-*- utf-8 -*-
 
+import os
 import re
+import json
+import time
+import signal
+import hashlib
 import yaml
 import logging
+import threading
 import subprocess
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from common.config import YAML_CACHE_ENTRIES, YAML_CACHE_BYTES, EXEC_TIMEOUT, EXEC_MAX_BYTES
+from common.metrics import EXEC_SECONDS, YAML_CACHE_TOTAL
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
 
+# 优先使用 libyaml 实现的解析器
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def has_chinese_regex(string: str) -> bool:
     """
@@ -21,14 +36,129 @@ def has_chinese_regex(string: str) -> bool:
     return False
 
 
-def load_yaml(path):
+class LRUCache:
+    """
+    按条目数与内容大小限制内存的 LRU 缓存
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0  # 缓存内容的字节数
+        self._data = OrderedDict()  # key: 缓存键, value: (值, 字节数)
+        self._lock = threading.Lock()
+
+    def get(self, key) -> tuple[bool, object]:
+        """
+        :return: tuple(是否命中, 值)
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            self._data.move_to_end(key)
+            return True, item[0]
+
+    def put(self, key, value, size: int):
+        with self._lock:
+            if key in self._data:
+                self.size -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.size += size
+            while self._data and (len(self._data) > self.max_entries or self.size > self.max_bytes):
+                self.size -= self._data.popitem(last=False)[1][1]
+
+
+_yaml_cache = LRUCache(YAML_CACHE_ENTRIES, YAML_CACHE_BYTES)
+
+
+def blob_sha(content: bytes) -> str:
+    """
+    与 git hash-object 一致的 blob sha
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+def parse_yaml(content: bytes | str):
+    """
+    解析yaml内容, 解析结果按内容的 git blob sha 缓存, 相同内容只解析一次
+    返回值在多次调用之间共享, 调用方不能修改
+    :params content: yaml内容
+    :return:
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    key = blob_sha(content)
+    hit, value = _yaml_cache.get(key)
+    YAML_CACHE_TOTAL.inc(result="hit" if hit else "miss")
+    if not hit:
+        value = yaml.load(content, Loader=YAML_LOADER)
+        _yaml_cache.put(key, value, len(content))
+
+    return value
+
+
+def load_json(path: str) -> dict:
+    """
+    加载json文件
+    :params path: json路径
+    :return: 文件不存在或者格式错误时返回空字典
+    """
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as err:
+        logging.error(f"load {path} failed: {err}")
+        return {}
+
+
+def save_json(path: str, data: dict):
     """
-    加载yaml文件
-    :params path: yaml路径
+    保存json文件, 先写临时文件再替换, 避免读到写了一半的文件
+    :params path: json路径
+    :params data: 内容
     :return:
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class StageTimer:
+    """
+    分阶段累计耗时, 嵌套阶段的耗时只计入内层阶段
+    """
+
+    def __init__(self):
+        self.stages = {}  # key: 阶段名称, value: 累计耗时, 秒
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        统计代码块耗时
+        :params name: 阶段名称
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [0.0]  # 内层阶段耗时
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cost = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1][0] += cost
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + cost - frame[0]
 
 
 def exec_cmd(cmd: list[str]) -> tuple[int, str]:
@@ -37,6 +167,8 @@ def exec_cmd(cmd: list[str]) -> tuple[int, str]:
     :params cmd: 执行命令列表
     :return: tuple(状态码, 脚本执行标准输出), 状态码0: 执行成功, 1: 执行异常
     """
+    script = os.path.basename(str(cmd[0]))
+    start = time.perf_counter()
     try:
         result = subprocess.run(cmd,
                                 capture_output=True,
@@ -44,11 +176,133 @@ def exec_cmd(cmd: list[str]) -> tuple[int, str]:
                                 )
     except Exception as err:
         logging.error(err)
+        EXEC_SECONDS.observe(time.perf_counter() - start, script=script, code="error")
         return 1, ""
 
     code, out, err = result.returncode, result.stdout, result.stderr
+    EXEC_SECONDS.observe(time.perf_counter() - start, script=script, code=code)
     if code != 0:
         logging.info(f"some err happened, please check: {err}")
         return 1, ""
 
     return 0, out
+
+
+class CmdStream:
+    """
+    流式执行命令, 边执行边按分隔符逐条读取标准输出, 不在内存中保留完整输出
+    调用方可以随时停止读取, 命令随之被终止; 迭代结束后通过 code 判断执行结果:
+
+        with CmdStream(cmd) as stream:
+            for line in stream:
+                ...
+        if stream.code != 0:
+            ...
+    """
+
+    def __init__(self, cmd: list[str], timeout: float = EXEC_TIMEOUT, max_bytes: int = EXEC_MAX_BYTES,
+                 separator: str = "\n"):
+        """
+        :params cmd: 执行命令列表
+        :params timeout: 超时时间(秒), 超时后终止命令并视为执行异常
+        :params max_bytes: 标准输出最大字节数, 超过后终止命令并视为执行异常
+        :params separator: 输出记录的分隔符, 如 "\0" 用于 -z 格式的 git 输出
+        """
+        self.cmd = cmd
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.separator = separator.encode("utf-8")
+        self.code = None  # 状态码, 0: 执行成功或调用方提前停止, 1: 执行异常; 未结束时为 None
+        self.size = 0  # 已读取的字节数
+        self._process = None
+        self._timer = None
+        self._timed_out = False
+        self._start = 0.0
+
+    def __enter__(self) -> "CmdStream":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        self._start = time.perf_counter()
+        try:
+            stderr = tempfile.TemporaryFile()
+            # 独立进程组, 终止时连同脚本启动的 git 等子进程一起终止
+            self._process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=stderr, start_new_session=True)
+        except Exception as err:
+            logging.error(err)
+            self._finish(1, "error")
+            return
+
+        self._timer = threading.Timer(self.timeout, self._kill_on_timeout)
+        self._timer.daemon = True
+        self._timer.start()
+
+        with stderr:
+            pending = b""
+            while True:
+                chunk = self._process.stdout.read1(65536)
+                if not chunk:
+                    break
+
+                self.size += len(chunk)
+                if self.size > self.max_bytes:
+                    logging.error(f"output of {self.cmd[0]} exceeds {self.max_bytes} bytes, stop it")
+                    self._stop(1, "oversize")
+                    return
+
+                records = (pending + chunk).split(self.separator)
+                pending = records.pop()
+                for record in records:
+                    yield record.decode("utf-8", errors="replace")
+
+            code = self._process.wait()
+            self._timer.cancel()
+            if self._timed_out:
+                logging.error(f"{self.cmd[0]} timed out after {self.timeout}s")
+                self._finish(1, "timeout")
+                return
+            if code != 0:
+                stderr.seek(0)
+                logging.info(f"some err happened, please check: {stderr.read().decode('utf-8', errors='replace')}")
+                self._finish(1, code)
+                return
+
+            if pending:
+                yield pending.decode("utf-8", errors="replace")
+            self._finish(0, code)
+
+    def _kill(self):
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def _kill_on_timeout(self):
+        self._timed_out = True
+        self._kill()
+
+    def _finish(self, code: int, label):
+        if self.code is None:
+            self.code = code
+            EXEC_SECONDS.observe(time.perf_counter() - self._start, script=os.path.basename(str(self.cmd[0])),
+                                 code=label)
+
+    def _stop(self, code: int, label):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._process is not None:
+            self._kill()
+        if self._process is not None:
+            self._process.stdout.close()
+            self._process.wait()
+        self._finish(code, label)
+
+    def close(self):
+        """
+        停止读取并终止命令, 未读完的输出不影响状态码
+        """
+        if self.code is None and self._process is not None:
+            self._stop(0, "stopped")
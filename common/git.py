@@ -0,0 +1,321 @@
+#!-*- utf-8 -*-
+
+import logging
+import re
+import subprocess
+import threading
+from typing import Iterable, Iterator
+
+from common.func import exec_cmd
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
+
+# git diff --raw --numstat -M --no-abbrev -z 的参数, 一次输出文件状态和增删行数
+SNAPSHOT_DIFF_ARGS = "--raw --numstat -M --no-abbrev -z"
+# partial clone 中只对比目录树: 不统计增删行数, 只识别内容不变的重命名, 不需要获取任何文件内容
+BLOBLESS_DIFF_ARGS = "--raw -M100% --no-abbrev -z"
+
+
+class DiffEntry:
+    """
+    单个文件的变更记录
+    """
+
+    __slots__ = ("status", "path", "old_path", "old_sha", "new_sha", "added", "deleted")
+
+    def __init__(self, status: str, path: str, old_path: str = "", old_sha: str = "", new_sha: str = ""):
+        self.status = status  # git 状态, eg: A, M, D, R100
+        self.path = path  # 变更后的文件路径
+        self.old_path = old_path or path  # 变更前的文件路径, 仅重命名/复制时与 path 不同
+        self.old_sha = old_sha
+        self.new_sha = new_sha
+        self.added = None  # 新增行数, 二进制文件为 None
+        self.deleted = None  # 删除行数, 二进制文件为 None
+
+    def name_status(self) -> str:
+        """
+        与 git diff --name-status 输出一致的行
+        """
+        if self.status[0] in "RC":
+            return f"{self.status}\t{self.old_path}\t{self.path}"
+        return f"{self.status}\t{self.path}"
+
+
+class DiffSnapshot:
+    """
+    一次 PR 的 diff 快照, 由一次 git diff 生成, 供所有 checklist 条件在内存中查询
+    """
+
+    def __init__(self, entries: list[DiffEntry]):
+        self.entries = entries
+
+    @classmethod
+    def parse_tokens(cls, tokens: Iterable[str]) -> "DiffSnapshot":
+        """
+        逐条解析 git diff -z 输出中以 \\0 分割的记录, 可直接使用 CmdStream 的流式输出
+        :param tokens: 输出记录
+        :return:
+        """
+        tokens = iter(tokens)
+        entries, by_path = [], {}
+        for token in tokens:
+            if not token:
+                continue
+
+            if token.startswith(":"):  # raw: ":old_mode new_mode old_sha new_sha status\0path[\0new_path]"
+                _, _, old_sha, new_sha, status = token[1:].split(" ")
+                if status[0] in "RC":
+                    old_path = next(tokens)
+                    entry = DiffEntry(status, next(tokens), old_path, old_sha, new_sha)
+                else:
+                    entry = DiffEntry(status, next(tokens), "", old_sha, new_sha)
+                entries.append(entry)
+                by_path[entry.path] = entry
+                continue
+
+            # numstat: "added\tdeleted\tpath" 或重命名时 "added\tdeleted\t\0old_path\0new_path"
+            added, deleted, path = token.split("\t", 2)
+            if not path:
+                next(tokens)
+                path = next(tokens)
+            entry = by_path.get(path)
+            if entry is not None:
+                entry.added = None if added == "-" else int(added)
+                entry.deleted = None if deleted == "-" else int(deleted)
+
+        return cls(entries)
+
+    def names(self) -> list[str]:
+        """
+        所有变更文件名, 同 git diff --name-only
+        """
+        return [x.path for x in self.entries]
+
+    def filter(self, status: str) -> list[str]:
+        """
+        按状态过滤文件名, 同 git diff --name-only --diff-filter=<status>
+        :param status: A 新增, M 修改, D 删除, R 重命名...
+        """
+        return [x.path for x in self.entries if x.status[0] == status]
+
+    def name_status(self) -> list[str]:
+        """
+        同 git diff --name-status 的输出行
+        """
+        return [x.name_status() for x in self.entries]
+
+    def records(self) -> list[list[str]]:
+        """
+        可序列化的快照记录, 用于与之后的快照比较
+        """
+        return [[x.status, x.old_path, x.path, x.old_sha, x.new_sha] for x in self.entries]
+
+    def changed_paths(self, records: list[list[str]]) -> set[str]:
+        """
+        与之前的快照记录相比, 状态或内容有变化的文件
+        :param records: 之前快照的 records()
+        :return: 文件路径集合
+        """
+        diff = {tuple(x) for x in self.records()} ^ {tuple(x) for x in records}
+        return {x[1] for x in diff} | {x[2] for x in diff}
+
+
+def iter_patches(lines: Iterable[str], keep: re.Pattern = None) -> Iterator[tuple[str, list[str]]]:
+    """
+    逐个文件产出 git diff 输出, 每个文件的 diff 读完后立即产出, 调用方可以提前停止
+    :param lines: git diff 输出行, 可直接使用 CmdStream 的流式输出
+    :param keep: 只保留匹配的 diff 行, 为空时保留全部, 用于限制大文件 diff 占用的内存
+    :return: tuple(文件名, 该文件的 diff 行)
+    """
+    path, patch = None, []
+    for line in lines:
+        if line.startswith("diff --git "):
+            if path is not None:
+                yield path, patch
+            # diff --git a/<path> b/<path>, 修改的文件前后路径一致, 取后一半
+            rest = line[len("diff --git a/"):]
+            path, patch = rest[(len(rest) + 3) // 2:], []
+        elif path is not None and (keep is None or keep.match(line)):
+            patch.append(line)
+
+    if path is not None:
+        yield path, patch
+
+
+def rev_parse(git_dir: str, rev: str) -> str:
+    """
+    解析版本对应的提交
+    :return: 提交 sha, 失败返回空字符串
+    """
+    code, output = exec_cmd(["git", "-C", git_dir, "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"])
+    return output.strip() if code == 0 else ""
+
+
+def ls_remote(url: str, refs: list[str]) -> dict[str, str] | None:
+    """
+    查询远端仓库中引用指向的提交, 不获取任何对象
+    :param url: 远端仓库地址
+    :param refs: 完整引用名, eg: refs/heads/master
+    :return: key: 引用名, value: 提交 sha, 远端不存在的引用不在结果中; 失败返回 None
+    """
+    code, output = exec_cmd(["git", "ls-remote", url] + refs)
+    if code != 0:
+        return None
+
+    result = {}
+    for line in output.splitlines():
+        sha, _, ref = line.partition("\t")
+        result[ref] = sha
+    return result
+
+
+def list_tree(git_dir: str, rev: str, path: str) -> list[str] | None:
+    """
+    列出 rev 版本中 path 目录下的所有文件
+    :return: 文件路径列表, 失败返回 None
+    """
+    code, output = exec_cmd(["git", "-C", git_dir, "ls-tree", "-r", "-z", "--name-only", rev, "--", path])
+    if code != 0:
+        return None
+    return [x for x in output.split("\0") if x]
+
+
+def diff_tree(git_dir: str, old: str, new: str, path: str = "") -> list[tuple[str, str]] | None:
+    """
+    两个版本之间 path 目录下变化的文件, 重命名拆分为删除与新增
+    :param path: 目录, 为空时对比所有文件
+    :return: list[tuple(状态, 文件路径)], 失败(如提交不存在)返回 None
+    """
+    cmd = ["git", "-C", git_dir, "diff-tree", "-r", "-z", "--no-renames", "--name-status", old, new]
+    if path:
+        cmd += ["--", path]
+    code, output = exec_cmd(cmd)
+    if code != 0:
+        return None
+    tokens = [x for x in output.split("\0") if x]
+    return list(zip(tokens[0::2], tokens[1::2]))
+
+
+def merge_tree(git_dir: str, base: str, head: str) -> tuple[str, list[str]] | None:
+    """
+    在对象库中合并两个提交, 同 git merge-tree --write-tree, 不需要工作区
+    存在冲突时仍然生成合并后的目录树, 冲突文件中包含冲突标记
+    :param git_dir: 仓库目录
+    :param base: 合入分支提交
+    :param head: PR 提交
+    :return: tuple(合并后的目录树, 冲突文件列表), 失败返回 None
+    """
+    cmd = ["git", "-C", git_dir, "merge-tree", "--write-tree", "--name-only", "--no-messages", "-z",
+           "--allow-unrelated-histories", base, head]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+    except OSError as err:
+        logging.error(err)
+        return None
+
+    # 状态码 0: 没有冲突, 1: 存在冲突, 其他: 执行异常
+    if result.returncode not in (0, 1):
+        logging.error(f"merge {head} into {base} in {git_dir} failed: {result.stderr}")
+        return None
+
+    # 输出格式: "<tree>\0<冲突文件>\0<冲突文件>\0...", 同一文件的多个冲突阶段只输出一次
+    tree, *conflicts = [x for x in result.stdout.split("\0") if x]
+    return tree, conflicts
+
+
+class GitObjectReader:
+    """
+    基于常驻 git cat-file --batch 进程读取任意版本的文件内容, 不修改工作区
+    """
+
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self._proc = None
+        self._lock = threading.Lock()
+        self._partial = None
+
+    @property
+    def partial(self) -> bool:
+        """
+        是否是 partial clone, 缺失的文件内容在读取时从远端获取
+        """
+        if self._partial is None:
+            code, output = exec_cmd(["git", "-C", self.git_dir, "config", "--get", "remote.origin.promisor"])
+            self._partial = code == 0 and output.strip() == "true"
+        return self._partial
+
+    def prefetch(self, rev: str, paths: list[str]):
+        """
+        partial clone 中一次获取多个缺失的文件内容, 避免读取时逐个按需获取
+        :param rev: 版本
+        :param paths: 仓库相对路径
+        """
+        if not paths or not self.partial:
+            return
+
+        code, output = exec_cmd(["git", "-C", self.git_dir, "ls-tree", "-z", rev, "--", *paths])
+        if code != 0:
+            return
+        # 输出格式: "<mode> <type> <sha>\t<path>"
+        wanted = {x.split("\t", 1)[0].split(" ")[2] for x in output.split("\0") if " blob " in x}
+
+        code, output = exec_cmd(["git", "-C", self.git_dir, "rev-list", "--objects", "--no-walk",
+                                 "--missing=print", rev])
+        missing = [x[1:] for x in output.splitlines() if x.startswith("?") and x[1:] in wanted]
+        if code != 0 or not missing:
+            return
+
+        cmd = ["git", "-C", self.git_dir, "-c", "fetch.negotiationAlgorithm=noop", "fetch", "--quiet", "origin",
+               "--no-tags", "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin"]
+        try:
+            subprocess.run(cmd, input="\n".join(missing), text=True, capture_output=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as err:
+            logging.error(f"prefetch {len(missing)} objects in {self.git_dir} failed: {err}")
+
+    def _process(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(["git", "-C", self.git_dir, "cat-file", "--batch"],
+                                          stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE,
+                                          stderr=subprocess.DEVNULL,
+                                          )
+        return self._proc
+
+    def read(self, rev: str, path: str) -> bytes | None:
+        """
+        读取 rev 版本中 path 文件的内容
+        :param rev: 版本, eg: remotes/origin/master
+        :param path: 仓库相对路径
+        :return: 文件内容, 文件不存在时返回 None
+        """
+        with self._lock:
+            try:
+                proc = self._process()
+                proc.stdin.write(f"{rev}:{path}\n".encode("utf-8"))
+                proc.stdin.flush()
+
+                # 输出格式: "<sha> <type> <size>\n<content>\n" 或 "<object> missing\n"
+                header = proc.stdout.readline().decode("utf-8").split()
+                if len(header) != 3:
+                    return None
+
+                content = proc.stdout.read(int(header[2]))
+                proc.stdout.read(1)
+            except (OSError, ValueError) as err:
+                logging.error(f"read {rev}:{path} from {self.git_dir} failed: {err}")
+                self.close()
+                return None
+
+        return content if header[1] == "blob" else None
+
+    def close(self):
+        """
+        关闭 cat-file 进程
+        """
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._proc.kill()
+            self._proc = None
@@ -1,11 +1,211 @@
 #!-*- utf-8 -*-
+import heapq
+import itertools
 import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.metrics import GITCODE_REQUEST_SECONDS
+from common.config import GITCODE_POOL_SIZE, GITCODE_TIMEOUT, GITCODE_RETRIES, GITCODE_BACKOFF, \
+    GITCODE_RATE, GITCODE_BURST, GITCODE_RATE_LIMIT_RETRIES, GITCODE_API_URL
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s: %(message)s")
 
 SUC_CODE = [200, 201, 204]
+RETRY_STATUS = [500, 502, 503, 504]
+IDEMPOTENT_METHODS = ["GET", "HEAD", "OPTIONS", "PUT", "PATCH", "DELETE"]
+MAX_PER_PAGE = 100  # 分页接口单页最大条数
+
+# 请求优先级, 数值越小越先发送: 检查清单评论 > 查询 > 标签等非关键请求
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_sessions = {}
+_session_lock = threading.Lock()
+_limiters = {}
+_logins = {}  # key: access_token, value: token 所属用户名
+
+
+def get_session(pool_size: int = GITCODE_POOL_SIZE,
+                retries: int = GITCODE_RETRIES,
+                backoff: float = GITCODE_BACKOFF
+                ) -> requests.Session:
+    """
+    获取当前进程共享的 http session, 复用 keep-alive 连接, 并对幂等请求做指数退避重试
+    :param pool_size: 连接池大小
+    :param retries: 最大重试次数
+    :param backoff: 退避基数(秒), 同时作为随机抖动上限
+    :return:
+    """
+    # 按进程区分, fork 出的 worker 进程不能复用父进程的连接
+    key = (os.getpid(), pool_size, retries, backoff)
+    with _session_lock:
+        if key not in _sessions:
+            retry = Retry(total=retries,
+                          backoff_factor=backoff,
+                          backoff_jitter=backoff,
+                          status_forcelist=RETRY_STATUS,
+                          allowed_methods=IDEMPOTENT_METHODS,
+                          raise_on_status=False,
+                          # 429 只由限流器处理, 避免 urllib3 按 Retry-After 重试时绕过限流器并重复等待
+                          respect_retry_after_header=False,
+                          )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[key] = session
+
+    return _sessions[key]
+
+
+def _header(headers, *names: str) -> str | None:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+class RateLimiter:
+    """
+    令牌桶限流, 按优先级排队等待令牌; 根据响应中的限流头调整速率, 收到 429 时暂停到 Retry-After 之后
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate  # 每秒补充令牌数
+        self.burst = burst  # 令牌桶容量
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0  # 在此之前不发送任何请求, monotonic 时间
+        self.waited = 0.0  # 累计等待时间, 秒
+
+        self._cond = threading.Condition()
+        self._waiters = []  # 等待令牌的请求, 堆元素: (优先级, 序号)
+        self._seq = itertools.count()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority: int = PRIORITY_NORMAL):
+        """
+        获取一个令牌, 令牌不足时阻塞, 高优先级的请求先获取
+        :param priority: 请求优先级
+        """
+        start = time.monotonic()
+        with self._cond:
+            waiter = (priority, next(self._seq))
+            heapq.heappush(self._waiters, waiter)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiters[0] == waiter and now >= self.paused_until and self.tokens >= 1:
+                    break
+
+                if self._waiters[0] != waiter:
+                    delay = None  # 等待前面的请求获取令牌后唤醒
+                elif now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    delay = (1 - self.tokens) / self.rate
+                self._cond.wait(delay)
+
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            self.waited += time.monotonic() - start
+            self._cond.notify_all()
+
+    def update(self, headers):
+        """
+        根据响应中的限流头校准剩余令牌与补充速率, 使请求均匀分布到限流窗口内
+        :param headers: 响应头
+        """
+        remaining = _header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        reset = _header(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            return
+        if remaining is None:
+            return
+
+        # reset 可能是 unix 时间戳或剩余秒数
+        if reset is not None and reset > 1e9:
+            reset -= time.time()
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+            if reset is not None and reset > 0:
+                if remaining <= 0:
+                    self.paused_until = max(self.paused_until, now + reset)
+                else:
+                    self.rate = min(GITCODE_RATE, max(remaining / reset, 0.1))
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """
+        暂停发送请求
+        :param seconds: 暂停时间, 秒
+        """
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0)
+            self._cond.notify_all()
+
+
+def get_rate_limiter(rate: float = GITCODE_RATE, burst: int = GITCODE_BURST) -> RateLimiter:
+    """
+    获取当前进程共享的限流器, 同一 token 的所有请求共用令牌
+    """
+    key = (os.getpid(), rate, burst)
+    with _session_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(rate, burst)
+    return _limiters[key]
+
+
+def retry_after(response: requests.Response, default: float) -> float:
+    """
+    解析 Retry-After 响应头, 支持秒数与 http 日期两种格式
+    :return: 需要等待的秒数
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        reset = _header(response.headers, "X-RateLimit-Reset", "RateLimit-Reset")
+        try:
+            reset = float(reset)
+        except (TypeError, ValueError):
+            return default
+        return max(reset - time.time() if reset > 1e9 else reset, 0)
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _json(response: requests.Response):
+    try:
+        return response.json()
+    except ValueError:
+        logging.error(f"invalid json response: {response.text[:200]}")
+        return None
 
 
 class GitcodeApp:
@@ -13,45 +213,131 @@ class GitcodeApp:
     def __init__(self,
                  owner: str,
                  repo: str,
-                 access_token: str
+                 access_token: str,
+                 pool_size: int = GITCODE_POOL_SIZE,
+                 timeout: tuple = GITCODE_TIMEOUT,
+                 retries: int = GITCODE_RETRIES,
+                 backoff: float = GITCODE_BACKOFF
                  ):
         self.owner = owner
         self.repo = repo
         self.token = access_token
+        self.timeout = timeout  # (连接超时, 读取超时), 秒
+        self.pool_size = pool_size
+
+        self.base_url = GITCODE_API_URL
+        self.session = get_session(pool_size, retries, backoff)
+        self.limiter = get_rate_limiter()
+
+    def _endpoint(self, url: str) -> str:
+        """
+        接口路径模板, 用作指标标签, eg: /repos/{owner}/{repo}/pulls/{number}/comments
+        """
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        path = path.replace(f"/repos/{self.owner}/{self.repo}/", "/repos/{owner}/{repo}/", 1)
+        path = re.sub(r"/pulls/\d+", "/pulls/{number}", path)
+        path = re.sub(r"/comments/\d+", "/comments/{id}", path)
+        return re.sub(r"/labels/.+$", "/labels/{name}", path)
+
+    def _request(self, method: str, url: str, priority: int = PRIORITY_NORMAL, **kwargs) -> requests.Response | None:
+        """
+        通过共享 session 发送请求, access_token 统一放在 Authorization 请求头中, 不出现在 url 与日志里
+        请求经限流器排队发送, 被限流(429)时等待 Retry-After 后重新排队
+        :param method: 请求方法
+        :param url: 请求地址
+        :param priority: 请求优先级, PRIORITY_HIGH / PRIORITY_NORMAL / PRIORITY_LOW
+        :return: 响应, 网络异常时返回 None
+        """
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers.setdefault("Authorization", f"Bearer {self.token}")
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = self._endpoint(url)
+        for attempt in range(GITCODE_RATE_LIMIT_RETRIES + 1):
+            self.limiter.acquire(priority)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except requests.RequestException as err:
+                # 异常信息包含完整请求地址与查询参数, 只记录异常类型
+                logging.error(f"{method} {url} failed: {type(err).__name__}")
+                GITCODE_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                                method=method, endpoint=endpoint, status="error")
+                return None
+
+            GITCODE_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                            method=method, endpoint=endpoint, status=response.status_code)
+
+            self.limiter.update(response.headers)
+            if response.status_code != 429:
+                return response
+
+            delay = retry_after(response, GITCODE_BACKOFF * 2 ** attempt)
+            logging.warning(f"{method} {url} rate limited, retry after {delay:.1f}s")
+            self.limiter.pause(delay)
+
+        return response
+
+    def _get_comments_page(self, url: str, params: dict, page: int) -> tuple[list, int] | None:
+        """
+        获取一页评论
+        :return: tuple(评论列表, 总页数), 失败返回 None
+        """
+        response = self._request("GET", url, params=dict(params, page=page))
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"get pr comments failed, page: {page}, {getattr(response, 'text', '')}")
+            return None
 
-        self.base_url = "https://api.gitcode.com/api/v5"
+        comments = _json(response)
+        if not isinstance(comments, list):
+            return None
 
-    def get_pr_all_comments(self, pr_id: int, direction: str = "desc"):
+        total_page = response.headers.get("total_page")
+        return comments, int(total_page) if total_page else page
+
+    def iter_pr_comments(self, pr_id: int, direction: str = "desc"):
         """
         https://docs.gitcode.com/docs/apis/get-api-v-5-repos-owner-repo-pulls-number-comments
-        获取 pr 所有评论
+        逐页返回 pr 评论: 第一页获取总页数, 其余页并发获取, 按页序在每页到达后返回
         :param pr_id:
         :param direction:asc 升序, desc 降序
-        :return: 评论json
+        :return: 评论生成器
         """
         url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/comments"
-
-        page = 1
         params = {
-            "per_page": 10,
-            "access_token": self.token,
+            "per_page": MAX_PER_PAGE,
             "direction": direction,
             "comment_type": "pr_comment"
         }
 
-        result = []
-        while True:
-            params.update(page=page)
-            response = requests.get(url, params=params)
-            result.extend(response.json())
-
-            total_page = response.headers.get("total_page")
+        first = self._get_comments_page(url, params, 1)
+        if first is None:
+            return
 
-            if not total_page or int(total_page) <= page:
-                break
-            page += 1
+        comments, total_page = first
+        yield from comments
+        if total_page <= 1:
+            return
 
-        return result
+        with ThreadPoolExecutor(max_workers=min(total_page - 1, self.pool_size)) as executor:
+            futures = [executor.submit(self._get_comments_page, url, params, x) for x in range(2, total_page + 1)]
+            try:
+                for future in futures:
+                    result = future.result()
+                    if result is None:
+                        break
+                    yield from result[0]
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def get_pr_all_comments(self, pr_id: int, direction: str = "desc") -> list[dict]:
+        """
+        获取 pr 所有评论
+        :param pr_id:
+        :param direction:asc 升序, desc 降序
+        :return: 评论json
+        """
+        return list(self.iter_pr_comments(pr_id, direction))
 
     def create_comment(self, pr_id: int, body: str) -> bool:
         """
@@ -61,11 +347,11 @@ class GitcodeApp:
         :param body: 评论内容
         :return:
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/comments?access_token={self.token}"
-        response = requests.post(url, json=dict(body=body))
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/comments"
+        response = self._request("POST", url, PRIORITY_HIGH, json=dict(body=body))
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"create pr comment failed, {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"create pr comment failed, {getattr(response, 'text', '')}")
             return False
 
         return True
@@ -77,11 +363,11 @@ class GitcodeApp:
         :param comment_id: 评论id
         :return:
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/comments/{comment_id}?access_token={self.token}"
-        response = requests.delete(url)
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/comments/{comment_id}"
+        response = self._request("DELETE", url, PRIORITY_HIGH)
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"delete comment: {comment_id} failed: {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"delete comment: {comment_id} failed: {getattr(response, 'text', '')}")
             return False
 
         return True
@@ -94,11 +380,11 @@ class GitcodeApp:
         :param body: 需要更新的评论内容
         :return:
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/comments/{comment_id}?access_token={self.token}"
-        response = requests.patch(url, json=body)
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/comments/{comment_id}"
+        response = self._request("PATCH", url, PRIORITY_HIGH, json=dict(body=body))
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"edit comment: {comment_id} failed, {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"edit comment: {comment_id} failed, {getattr(response, 'text', '')}")
             return False
 
         return True
@@ -110,11 +396,12 @@ class GitcodeApp:
         :param pr_id:
         :return: 标签列表
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels?access_token={self.token}"
-        response = requests.get(url)
-        if response.status_code not in SUC_CODE:
-            logging.info(f"Get Pr Labels failed: {response.text}")
-        labels = [x.get("name") for x in response.json()]
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels"
+        response = self._request("GET", url, PRIORITY_LOW)
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"Get Pr Labels failed: {getattr(response, 'text', '')}")
+            return []
+        labels = [x.get("name") for x in _json(response) or [] if isinstance(x, dict)]
         return labels
 
     def del_pr_labels(self, pr_id: int, labels: str) -> bool:
@@ -125,11 +412,12 @@ class GitcodeApp:
         :param labels: 标签，多个标签用,分割，eg: "bug,feature"
         :return:
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels/{labels}?access_token={self.token}"
-        response = requests.delete(url)
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels/{labels}"
+        response = self._request("DELETE", url, PRIORITY_LOW)
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"delete repo: {self.repo}, pr: {pr_id}, labels: {labels} failed: {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"delete repo: {self.repo}, pr: {pr_id}, labels: {labels} failed: "
+                         f"{getattr(response, 'text', '')}")
             return False
 
         return True
@@ -142,15 +430,35 @@ class GitcodeApp:
         :param labels: 标签，多个标签用,分割，eg: "bug,feature"
         :return: 标签列表
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels?access_token={self.token}"
-        response = requests.post(url, json=labels)
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}/labels"
+        response = self._request("POST", url, PRIORITY_LOW, json=labels)
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"add repo: {self.repo}, pr: {pr_id} label failed: {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"add repo: {self.repo}, pr: {pr_id} label failed: {getattr(response, 'text', '')}")
             return False
 
         return True
 
+    def get_login(self) -> str | None:
+        """
+        https://docs.gitcode.com/docs/apis/get-api-v-5-user
+        获取 access_token 所属用户名, 即机器人账号, 每个进程只查询一次
+        :return: 用户名, 失败返回 None
+        """
+        if self.token in _logins:
+            return _logins[self.token]
+
+        url = f"{self.base_url}/user"
+        response = self._request("GET", url)
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"get user failed: {getattr(response, 'text', '')}")
+            return None
+
+        login = (_json(response) or {}).get("login")
+        if login:
+            _logins[self.token] = login
+        return login
+
     def get_pr_detail(self, pr_id: int):
         """
         https://docs.gitcode.com/docs/apis/get-api-v-5-repos-owner-repo-pulls-number
@@ -158,14 +466,14 @@ class GitcodeApp:
         :params pr_id:
         :return: pr详情
         """
-        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}?access_token={self.token}"
-        response = requests.get(url)
+        url = f"{self.base_url}/repos/{self.owner}/{self.repo}/pulls/{pr_id}"
+        response = self._request("GET", url)
 
-        if response.status_code not in SUC_CODE:
-            logging.info(f"Get repo: {self.repo}, pr: {pr_id} detail failed: {response.text}")
+        if response is None or response.status_code not in SUC_CODE:
+            logging.info(f"Get repo: {self.repo}, pr: {pr_id} detail failed: {getattr(response, 'text', '')}")
             return
 
-        return response.json()
+        return _json(response)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,222 @@
+#!-*- utf-8 -*-
+
+import math
+import threading
+
+# 耗时直方图默认分桶, 秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # key: 标签值 tuple
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(x, "")) for x in self.labelnames)
+
+    def _labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def drain(self) -> dict:
+        """
+        取出并清空当前值, 用于 worker 进程向主进程汇报增量
+        """
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    """
+    累加计数
+    """
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values: dict):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in values]
+
+
+class Gauge(_Metric):
+    """
+    当前值, 只在本进程内设置, 不参与 worker 增量汇报
+    """
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def drain(self) -> dict:
+        return {}
+
+    def merge(self, values: dict):
+        pass
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in values]
+
+
+class Histogram(_Metric):
+    """
+    分桶统计耗时分布, 可由 histogram_quantile 计算 p50/p99
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # 各分桶计数(非累计), 最后两项为总和与次数
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def merge(self, values: dict):
+        with self._lock:
+            for key, data in values.items():
+                current = self._values.get(key)
+                if current is None:
+                    self._values[key] = list(data)
+                else:
+                    self._values[key] = [x + y for x, y in zip(current, data)]
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((k, list(v)) for k, v in self._values.items())
+
+        lines = super().render()
+        for key, data in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(data[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {data[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    进程内指标集合; worker 进程定期将增量发送给主进程合并, 由主进程统一输出
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def drain(self) -> dict:
+        """
+        取出并清空所有计数与直方图的增量
+        :return: key: 指标名称, value: 增量, 可 pickle
+        """
+        delta = {}
+        for name, metric in self._metrics.items():
+            values = metric.drain()
+            if values:
+                delta[name] = values
+        return delta
+
+    def merge(self, delta: dict):
+        """
+        合并 worker 进程汇报的增量
+        :param delta: drain() 的返回值
+        """
+        for name, values in (delta or {}).items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def render(self) -> str:
+        """
+        输出 Prometheus 文本格式
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOB_SECONDS = REGISTRY.histogram("review_job_seconds", "PR review job latency in seconds",
+                                 ("action", "result"))
+STAGE_SECONDS = REGISTRY.histogram("review_stage_seconds", "Time spent in each stage of a PR review job",
+                                   ("stage",))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("review_queue_wait_seconds", "Time a job waited in the queue")
+JOBS_TOTAL = REGISTRY.counter("review_jobs_total", "PR review jobs by outcome", ("result",))
+EXEC_SECONDS = REGISTRY.histogram("review_exec_seconds", "Subprocess latency by script", ("script", "code"))
+GITCODE_REQUEST_SECONDS = REGISTRY.histogram("gitcode_request_seconds", "Gitcode API latency",
+                                             ("method", "endpoint", "status"))
+YAML_CACHE_TOTAL = REGISTRY.counter("review_yaml_cache_total", "Parsed YAML cache lookups", ("result",))
+RESULT_CACHE_TOTAL = REGISTRY.counter("review_result_cache_total", "Checklist result cache lookups", ("result",))
+QUEUE_DEPTH = REGISTRY.gauge("review_queue_depth", "Jobs waiting in the queue")
+BUSY_WORKERS = REGISTRY.gauge("review_busy_workers", "Workers running a job")
+WEBHOOK_REJECTED_TOTAL = REGISTRY.counter("review_webhook_rejected_total", "Webhooks rejected at ingress", ("reason",))
+WORKSPACE_BYTES = REGISTRY.gauge("review_workspace_bytes", "Disk space used by the data directory")
+WORKSPACE_EVICTED_TOTAL = REGISTRY.counter("review_workspace_evicted_total", "Mirrors removed from the data directory",
+                                           ("reason",))
+INGRESS_PENDING = REGISTRY.gauge("review_ingress_pending", "Accepted webhooks not yet handed to the worker pool")
@@ -45,6 +45,42 @@ Config = load_config()
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = Config.get("SECRET_KEY")
 ACCESS_TOKEN = Config.get("ACCESS_TOKEN")
+# webhook 密钥, 配置后校验请求签名; webhook 请求体大小上限(字节)
+WEBHOOK_SECRET = Config.get("WEBHOOK_SECRET")
+WEBHOOK_MAX_BODY_SIZE = Config.get("WEBHOOK_MAX_BODY_SIZE", 1024 * 1024)
+
+# 任务执行配置: worker 进程数, 单任务超时时间(秒), 等待队列最大长度, 同一 PR 事件合并窗口(秒)
+WORKER_POOL_SIZE = Config.get("WORKER_POOL_SIZE", os.cpu_count() or 1)
+JOB_TIMEOUT = Config.get("JOB_TIMEOUT", 600)
+JOB_QUEUE_SIZE = Config.get("JOB_QUEUE_SIZE", 1000)
+JOB_DEBOUNCE_WINDOW = Config.get("JOB_DEBOUNCE_WINDOW", 5)
+
+# 任务记录配置: 恢复的任务最多执行次数, 刷新任务记录的间隔(秒),
+# 未完成任务超过多久未刷新视为服务进程已退出并重新入队(秒), 已结束任务记录的保留时间(秒)
+JOB_MAX_ATTEMPTS = Config.get("JOB_MAX_ATTEMPTS", 3)
+JOB_HEARTBEAT_INTERVAL = Config.get("JOB_HEARTBEAT_INTERVAL", 30)
+JOB_STALE_AFTER = Config.get("JOB_STALE_AFTER", 120)
+JOB_RETENTION = Config.get("JOB_RETENTION", 7 * 86400)
+
+# webhook 入口配置: DEBUG 模式下已接收未执行的任务数上限; 同时提交的任务数(DEBUG 模式下为同时执行的任务数)
+INGRESS_QUEUE_SIZE = Config.get("INGRESS_QUEUE_SIZE", 10000)
+INGRESS_CONCURRENCY = Config.get("INGRESS_CONCURRENCY", 4)
+
+# 单个任务内并发计算检查条件的线程数, 1 表示串行计算
+CONDITION_WORKERS = Config.get("CONDITION_WORKERS", 4)
+
+# 检查条件结果缓存的最大条目数, 保存在 DATABASES 中, 0 表示不缓存
+RESULT_CACHE_SIZE = Config.get("RESULT_CACHE_SIZE", 10000)
+
+# 代码镜像模式: full 完整镜像; blobless 只获取提交与目录树, 文件内容按需获取
+ENV_MODE = Config.get("ENV_MODE", "full")
+
+# data 目录配置: 最大占用空间(字节), 磁盘最少剩余空间(字节), 超出时淘汰最久未使用的仓库镜像;
+# 定期回收间隔(秒), PR 评估状态超过多久未更新则删除(秒)
+WORKSPACE_QUOTA = Config.get("WORKSPACE_QUOTA", 50 * 1024 ** 3)
+WORKSPACE_MIN_FREE = Config.get("WORKSPACE_MIN_FREE", 5 * 1024 ** 3)
+WORKSPACE_GC_INTERVAL = Config.get("WORKSPACE_GC_INTERVAL", 600)
+WORKSPACE_STATE_TTL = Config.get("WORKSPACE_STATE_TTL", 30 * 86400)
 
 ALLOWED_HOSTS = ['*']
 
@@ -57,6 +93,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'business',
 ]
 
 MIDDLEWARE = [
@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'robot_universal_ci_tools.settings')
 
 application = get_wsgi_application()
+
+# 启动 data 目录定期回收; 启动 worker 池, 恢复服务重启前未完成的任务
+from django.conf import settings  # noqa: E402
+from business.workspace import get_workspace_manager  # noqa: E402
+
+get_workspace_manager().start()
+if not settings.DEBUG:
+    from business.worker import get_worker_pool  # noqa: E402
+
+    get_worker_pool()
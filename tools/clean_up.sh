@@ -1,6 +0,0 @@
-#!/bin/bash
-
-# shellcheck disable=SC2034
-dir=$1
-
-rm -rf "${dir}"
@@ -6,12 +6,13 @@ branch=$2
 work_dir=$3
 args=$4
 target_file=$5
+revs=${6:-"remotes/origin/${branch}"}  # 对比的版本, 默认合入分支与工作区对比, 也可以是两个版本 "<base> <tree>"
 
 current_pwd="$(pwd)"
 
 cd "${work_dir}/${repo}" || exit
 
-# 实际: git diff $args remotes/origin/${branch} $target_file
+# 实际: git diff $args remotes/origin/${branch} -- $target_file
 
 cmd="git diff "
 
@@ -19,7 +20,7 @@ if [ "${args}" ]; then
   cmd+="${args}"
 fi
 
-cmd+=" remotes/origin/${branch} "
+cmd+=" ${revs} -- "
 
 if [ "${target_file}" ]; then
   cmd+="${target_file}"
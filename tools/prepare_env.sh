@@ -5,37 +5,74 @@ owner=$1
 repo=$2
 pr_id=$3
 branch=$4
-work_dir=$5
+mirror_dir=$5   # 本地镜像仓目录, 按 owner/repo 复用
+repo_url=${6:-"https://gitcode.com/${owner}/${repo}.git"}
+mode=${7:-full}  # full: 完整镜像; blobless: 只获取提交与目录树, 文件内容按需获取
 
-current_pwd="$(pwd)"
-repo_url="https://gitcode.com/${owner}/${repo}.git"
+# 只准备镜像仓中的提交, 不创建工作区; PR 与合入分支的合并由调用方通过 git merge-tree 在对象库中完成
+# git 输出统一写到标准错误, 标准输出只输出 "base <sha>" 和 "head <sha>", blobless 模式另外输出 "merge_base <sha>"
+exec 3>&1 1>&2
 
-# init work dir
-if [ ! -d "${work_dir}" ]; then
-    mkdir -p "${work_dir}"
-fi
+# 更新镜像仓: 首次全量 clone, 之后只增量 fetch 新对象
+# 同一仓库的多个任务通过 flock 串行更新镜像
+mkdir -p "$(dirname "${mirror_dir}")"
+exec 9>"${mirror_dir}.lock"
+flock 9
 
-cd "${work_dir}" || exit
+if [ "${mode}" = "blobless" ]; then
+    # partial clone: 不下载文件内容, 只获取最新提交, 再按需加深到合并基点
+    if [ ! -d "${mirror_dir}" ]; then
+        git clone --bare --filter=blob:none --depth=1 --single-branch --branch "${branch}" \
+            "${repo_url}" "${mirror_dir}" || exit 1
+    fi
 
-# clear env
-if [ -d "${repo}" ]; then
-    rm -rf "${repo}"
-fi
+    branch_ref="+refs/heads/${branch}:refs/heads/${branch}"
+    pr_ref="+refs/merge-requests/${pr_id}/head:refs/merge-requests/${pr_id}/head"
+
+    # 已有的合入分支增量获取新提交, 第一次获取的分支只取最新提交
+    depth=""
+    git -C "${mirror_dir}" rev-parse --verify --quiet "refs/heads/${branch}" >/dev/null || depth="--depth=1"
+    # shellcheck disable=SC2086
+    git -C "${mirror_dir}" fetch --filter=blob:none ${depth} origin "${branch_ref}" || exit 1
+    git -C "${mirror_dir}" fetch --filter=blob:none --depth=1 origin "${pr_ref}" || exit 1
+    # sig 信息等以 master 为准, 合入其他分支时也需要 master 的最新提交
+    if [ "${branch}" != "master" ]; then
+        git -C "${mirror_dir}" fetch --filter=blob:none --depth=1 origin "+refs/heads/master:refs/heads/master"
+    fi
+
+    base=$(git -C "${mirror_dir}" rev-parse "refs/heads/${branch}")
+    head=$(git -C "${mirror_dir}" rev-parse "refs/merge-requests/${pr_id}/head")
 
-# clone repo
-git clone --depth 1 "${repo_url}"
-cd "${repo}" || exit
-git checkout "${branch}"
-git pull
+    # 逐步加深历史直到找到合并基点; 完整历史中也没有时为无关历史
+    step=8
+    until git -C "${mirror_dir}" merge-base "${base}" "${head}" >/dev/null; do
+        [ -f "${mirror_dir}/shallow" ] || break
+        if [ ${step} -gt 1024 ]; then
+            git -C "${mirror_dir}" fetch --filter=blob:none --unshallow origin "${branch_ref}" "${pr_ref}" || exit 1
+        else
+            git -C "${mirror_dir}" fetch --filter=blob:none --deepen=${step} origin "${branch_ref}" "${pr_ref}" || exit 1
+        fi
+        step=$((step * 2))
+    done
 
-# fetch pr
-git fetch origin refs/merge-requests/"${pr_id}"/head:pr_"${pr_id}"
+    flock -u 9
+
+    echo "base ${base}" >&3
+    echo "head ${head}" >&3
+    echo "merge_base $(git -C "${mirror_dir}" merge-base "${base}" "${head}")" >&3
+    exit 0
+fi
+
+if [ ! -d "${mirror_dir}" ]; then
+    git clone --bare "${repo_url}" "${mirror_dir}" || exit 1
+fi
 
-# create tmp work branch
-# define branch name starts with "tmp_pr_"
-git checkout -b tmp_pr_"${pr_id}"
+refs=("+refs/heads/${branch}:refs/heads/${branch}" "+refs/merge-requests/${pr_id}/head:refs/merge-requests/${pr_id}/head")
+# sig 信息等以 master 为准, 合入其他分支时同时更新 master
+[ "${branch}" = "master" ] || refs+=("+refs/heads/master:refs/heads/master")
+git -C "${mirror_dir}" fetch --prune origin "${refs[@]}" || exit 1
 
-# merge pr code to tmp work branch
-git merge --no-edit --allow-unrelated-histories "pr_${pr_id}"
+flock -u 9
 
-cd "${current_pwd}" || exit
+echo "base $(git -C "${mirror_dir}" rev-parse "refs/heads/${branch}")" >&3
+echo "head $(git -C "${mirror_dir}" rev-parse "refs/merge-requests/${pr_id}/head")" >&3